@@ -40,6 +40,14 @@ except ImportError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Fixed per-frame header sent by remote_inference_client.py:
+# sensor timestamp, steering, throttle, arduino millis, JPEG size
+FRAME_HEADER = struct.Struct('<dffQI')
+
+# Ask recv to wait for the full length (one syscall per header/frame);
+# not every platform defines it
+_MSG_WAITALL = getattr(socket, 'MSG_WAITALL', 0)
+
 class DummyModel:
     """Placeholder model for testing without trained weights"""
     
@@ -162,25 +170,27 @@ class ClientHandler:
         
         logger.info(f"New client connected: {client_address}")
     
-    def recv_exact(self, size: int) -> Optional[bytes]:
+    def recv_exact(self, size: int) -> Optional[bytearray]:
         """Receive exactly 'size' bytes with robust error handling"""
         try:
-            data = b''
+            buf = bytearray(size)
+            view = memoryview(buf)
             bytes_received = 0
             
             while bytes_received < size:
-                chunk = self.socket.recv(min(4096, size - bytes_received))
-                if not chunk:
+                # MSG_WAITALL normally fills the whole view in one call; the loop
+                # only covers short reads (signals, or the 30s socket timeout)
+                n = self.socket.recv_into(view[bytes_received:], size - bytes_received, _MSG_WAITALL)
+                if not n:
                     return None
-                data += chunk
-                bytes_received += len(chunk)
+                bytes_received += n
                 
                 # Progress for large transfers
                 if size > 10000 and bytes_received % 50000 == 0:
                     progress = (bytes_received / size) * 100
                     logger.debug(f"Receiving: {bytes_received}/{size} bytes ({progress:.1f}%)")
             
-            return data
+            return buf
         except Exception as e:
             logger.error(f"Error receiving data: {e}")
             return None
@@ -196,21 +206,20 @@ class ClientHandler:
             self.socket.settimeout(30.0)  # 30 second timeout
             
             while self.running:
-                # Receive message header
-                header_size_data = self.recv_exact(4)
-                if not header_size_data:
-                    break
-                    
-                header_size = struct.unpack('I', header_size_data)[0]
-                header_data = self.recv_exact(header_size)
-                
+                # Receive fixed-size message header
+                header_data = self.recv_exact(FRAME_HEADER.size)
                 if not header_data:
                     break
                 
                 # Parse header
-                message = json.loads(header_data.decode())
-                frame_size = message['frame_size']
-                sensor_data = message['sensor_data']
+                (timestamp, steering_current, throttle_current,
+                 arduino_timestamp, frame_size) = FRAME_HEADER.unpack(header_data)
+                sensor_data = {
+                    'timestamp': timestamp,
+                    'steering_current': steering_current,
+                    'throttle_current': throttle_current,
+                    'arduino_timestamp': arduino_timestamp
+                }
                 
                 # Receive frame data
                 frame_data = self.recv_exact(frame_size)
@@ -40,6 +40,14 @@ except ImportError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Fixed per-frame header sent by remote_inference_client.py:
+# sensor timestamp, steering, throttle, arduino millis, JPEG size
+FRAME_HEADER = struct.Struct('<dffQI')
+
+# Ask recv to wait for the full length (one syscall per header/frame);
+# not every platform defines it
+_MSG_WAITALL = getattr(socket, 'MSG_WAITALL', 0)
+
 class DummyModel:
     """Placeholder model for testing without trained weights"""
     
@@ -168,21 +176,20 @@ class ClientHandler:
         
         try:
             while self.running:
-                # Receive message header
-                header_size_data = self._recv_exact(4)
-                if not header_size_data:
-                    break
-                    
-                header_size = struct.unpack('I', header_size_data)[0]
-                header_data = self._recv_exact(header_size)
-                
+                # Receive fixed-size message header
+                header_data = self._recv_exact(FRAME_HEADER.size)
                 if not header_data:
                     break
                 
                 # Parse header
-                message = json.loads(header_data.decode())
-                frame_size = message['frame_size']
-                sensor_data = message['sensor_data']
+                (timestamp, steering_current, throttle_current,
+                 arduino_timestamp, frame_size) = FRAME_HEADER.unpack(header_data)
+                sensor_data = {
+                    'timestamp': timestamp,
+                    'steering_current': steering_current,
+                    'throttle_current': throttle_current,
+                    'arduino_timestamp': arduino_timestamp
+                }
                 
                 # Receive frame data
                 frame_data = self._recv_exact(frame_size)
@@ -237,16 +244,20 @@ class ClientHandler:
             self.socket.close()
             logger.info(f"Client disconnected: {self.address}")
     
-    def _recv_exact(self, size: int) -> Optional[bytes]:
-        """Receive exactly 'size' bytes"""
+    def _recv_exact(self, size: int) -> Optional[bytearray]:
+        """Receive exactly 'size' bytes into one preallocated buffer"""
         try:
-            data = b''
-            while len(data) < size:
-                chunk = self.socket.recv(size - len(data))
-                if not chunk:
+            buf = bytearray(size)
+            view = memoryview(buf)
+            received = 0
+            while received < size:
+                # MSG_WAITALL normally fills the whole view in one call; the loop
+                # only covers short reads (signals, or sockets with a timeout)
+                n = self.socket.recv_into(view[received:], size - received, _MSG_WAITALL)
+                if not n:
                     return None
-                data += chunk
-            return data
+                received += n
+            return buf
         except:
             return None
     
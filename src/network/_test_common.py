@@ -0,0 +1,143 @@
+"""
+Shared Test Protocol and Client Helpers
+=======================================
+
+Wire format spoken by the network test clients (test_client.py,
+simple_frame_test.py, test_network_client.py) and _test_server_core.py,
+plus the socket and camera helpers the Raspberry Pi clients share. The
+protocol lives only here, so a change to it touches one file.
+"""
+
+import atexit
+import functools
+import json
+import socket
+import struct
+import cv2
+
+# Optional fast JSON encoder (orjson returns bytes directly); stdlib fallback
+try:
+    import orjson
+    dumps_json = orjson.dumps
+except ImportError:
+    def dumps_json(obj):
+        return json.dumps(obj).encode()
+
+# Client -> server header: payload length, then a 1-byte type tag so the
+# server branches on one compare instead of probing the payload
+MSG_HEADER = struct.Struct('>IB')
+MSG_JSON, MSG_JPEG, MSG_TEST = 0, 1, 2
+
+# Server -> client replies carry only the 4-byte big-endian length prefix
+RESP_LEN = struct.Struct('>I')
+
+# Reply to text messages: message id, status code, server time (20 bytes,
+# parsed with a single unpack on the Pi instead of a JSON decode)
+ACK = struct.Struct('>IQd')
+ACK_INVALID, ACK_RECEIVED = 0, 1
+
+# Struct-packed test message body sent by test_network_client.py:
+# test id, monotonic send time (ns), text length (16 bytes, network order)
+TEST_MSG_HEADER = struct.Struct('!IQI')
+
+LINGER_RESET = struct.pack('ii', 1, 0)  # SO_LINGER on, 0s timeout
+
+@functools.lru_cache(maxsize=None)
+def local_ip():
+    """Our own address, resolved once; the lookup can block for 100+ ms on mDNS"""
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except OSError:
+        return None
+
+def check_jpeg_build(warn=print):
+    """Return whether OpenCV encodes JPEG via libjpeg-turbo with NEON SIMD, calling warn() if not"""
+    build_info = cv2.getBuildInformation()
+    has_turbo = 'libjpeg-turbo' in build_info
+    has_neon = 'NEON' in build_info
+    if not (has_turbo and has_neon):
+        warn(f"⚠️  OpenCV JPEG path is not accelerated (libjpeg-turbo={has_turbo}, NEON={has_neon}); "
+             "install an OpenCV build linked against libjpeg-turbo (--with-simd)")
+    return has_turbo and has_neon
+
+def configure_socket(sock, timeout):
+    """Apply the low-latency options every test client uses"""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow quick re-bind between runs
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, LINGER_RESET)  # RST on close, no TIME_WAIT
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Don't hold the payload behind the length prefix
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024*1024)  # 1MB send buffer
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024*1024)  # 1MB receive buffer
+    sock.settimeout(timeout)
+
+_sock = None  # Shared server connection, reused across tests
+
+def get_connection(server_ip, server_port=8889, timeout=15.0):
+    """Return the shared server connection, connecting on first use"""
+    global _sock
+    if _sock is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        configure_socket(sock, timeout)
+        sock.connect((server_ip, server_port))
+        _sock = sock
+    return _sock
+
+def close_connection():
+    """Close the shared server connection"""
+    global _sock
+    if _sock is not None:
+        _sock.close()
+        _sock = None
+
+atexit.register(close_connection)
+
+_cap = None  # Shared camera capture, opened once and reused across tests
+
+def get_capture(frame_size=(640, 480)):
+    """Return the shared camera capture, opening it on first use"""
+    global _cap
+    if _cap is None:
+        _cap = cv2.VideoCapture(0)
+
+        # Let the camera/ISP scale to the send resolution
+        _cap.set(cv2.CAP_PROP_FRAME_WIDTH, frame_size[0])
+        _cap.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_size[1])
+
+        # Ask V4L2 for MJPEG and keep it compressed so frames can be
+        # forwarded without a decode + re-encode round trip
+        _cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        _cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+    return _cap
+
+def release_capture():
+    """Release the shared camera capture"""
+    global _cap
+    if _cap is not None:
+        _cap.release()
+        _cap = None
+
+atexit.register(release_capture)
+
+def recv_exact(sock, n):
+    """Receive exactly n bytes into a preallocated buffer"""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        received = sock.recv_into(view[got:])
+        if not received:
+            raise ConnectionError("Connection closed by server")
+        got += received
+    return bytes(buf)
+
+def send_frame(sock, frame_data):
+    """Send JPEG header + frame with one sendmsg() call, without concatenating"""
+    frame_view = memoryview(frame_data).cast('B')
+    header = MSG_HEADER.pack(frame_view.nbytes, MSG_JPEG)
+    sent = sock.sendmsg([header, frame_view])
+
+    # sendmsg may write partially; finish whatever is left
+    if sent < len(header):
+        sock.sendall(header[sent:])
+        sent = len(header)
+    if sent - len(header) < frame_view.nbytes:
+        sock.sendall(frame_view[sent - len(header):])
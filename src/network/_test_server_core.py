@@ -0,0 +1,424 @@
+"""
+Shared Test Server Core
+=======================
+
+Event-loop server used by test_server.py and test_server_laptop_fixed.py.
+Those scripts are thin command-line wrappers that only choose socket
+options and log verbosity; all framing, buffering and frame decoding
+lives here.
+"""
+
+import os
+import socket
+import json
+import logging
+import logging.handlers
+import queue
+import selectors
+import threading
+import time
+import sys
+import cv2
+import numpy as np
+
+from _test_common import (ACK, ACK_INVALID, ACK_RECEIVED, MSG_HEADER, MSG_JPEG, MSG_JSON,
+                          MSG_TEST, RESP_LEN, TEST_MSG_HEADER)
+
+# Optional libjpeg-turbo bindings (PyTurboJPEG) decode into a reused array;
+# cv2.imdecode fallback allocates a new one per frame
+try:
+    from turbojpeg import TurboJPEG
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError):
+    _turbo_jpeg = None
+
+# Optional nvJPEG decode through torchvision (>= 0.19 for batches); frames
+# that pile up in the decode queue are decoded on the GPU in one call
+try:
+    import torch
+    from torchvision.io import ImageReadMode, decode_jpeg
+    _GPU_DECODE = torch.cuda.is_available()
+except ImportError:
+    _GPU_DECODE = False
+GPU_DECODE_BATCH = 8
+
+# Scatter-gather send of prefix + payload; Windows sockets lack sendmsg()
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+# Per-message output is only enqueued; a QueueListener thread formats it and
+# does the blocking write to stdout, off the event loop and decode worker
+logger = logging.getLogger('test_server')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+
+# Receive buffers are recycled across messages and connections instead of
+# being allocated per frame; new ones are sized to the largest message seen
+_BUF_POOL = queue.SimpleQueue()
+_max_buf_size = 0
+
+def _acquire(length):
+    """Take a pooled buffer of at least 'length' bytes"""
+    global _max_buf_size
+    if length > _max_buf_size:
+        _max_buf_size = length
+    try:
+        buf = _BUF_POOL.get_nowait()
+    except queue.Empty:
+        return bytearray(_max_buf_size)
+    if len(buf) < length:
+        # Too small for this message; drop it for one of the current max size
+        return bytearray(_max_buf_size)
+    return buf
+
+def _release(view):
+    """Return the buffer behind a received message view to the pool"""
+    if view is not None:
+        _BUF_POOL.put(view.obj)
+
+# Connection states for the event loop
+READ_LEN, READ_BODY, WRITE_RESP = range(3)
+
+class FramedConnection:
+    """Non-blocking length-prefixed connection driven by a selector loop
+
+    recv_frame() and send_frame() each make as much progress as the socket
+    allows and are called again when the selector reports it ready.
+    """
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.message_count = 0
+        self.msg_type = None  # Type tag of the message being received
+        self.len_view = memoryview(bytearray(MSG_HEADER.size))
+        self.hdr_buf = bytearray(RESP_LEN.size)
+        self.pending = []  # Unsent response buffers, front first
+        self.state = READ_LEN
+        self.view = self.len_view
+        self.offset = 0
+    
+    def recv_frame(self):
+        """Read what is available; return the message memoryview once it is complete"""
+        try:
+            n = self.sock.recv_into(self.view[self.offset:])
+        except BlockingIOError:
+            return None
+        if not n:
+            raise ConnectionError("Connection closed by client")
+        self.offset += n
+        if self.offset < len(self.view):
+            return None
+        
+        if self.state == READ_LEN:
+            length, self.msg_type = MSG_HEADER.unpack_from(self.len_view)
+            if not length:
+                raise ConnectionError("Empty message from client")
+            self.state = READ_BODY
+            self.view = memoryview(_acquire(length))[:length]
+            self.offset = 0
+            return None
+        
+        # Body complete; the caller owns it until it is passed to _release()
+        message = self.view
+        self.view = self.len_view
+        self.offset = 0
+        return message
+    
+    def send_frame(self, payload):
+        """Frame a response and start sending it; True if it went out in full"""
+        self.state = WRITE_RESP
+        RESP_LEN.pack_into(self.hdr_buf, 0, len(payload))
+        self.pending = [memoryview(self.hdr_buf), memoryview(payload)]
+        return self.flush()
+    
+    def flush(self):
+        """Send what the socket accepts of the pending response; True once it is all out"""
+        try:
+            if _HAS_SENDMSG:
+                sent = self.sock.sendmsg(self.pending)
+            else:
+                sent = self.sock.send(self.pending[0])
+        except BlockingIOError:
+            return False
+        
+        # Drop whatever went out from the front of the pending buffers
+        while self.pending and sent >= len(self.pending[0]):
+            sent -= len(self.pending.pop(0))
+        if self.pending:
+            self.pending[0] = self.pending[0][sent:]
+            return False
+        self.state = READ_LEN
+        return True
+
+class TestServer:
+    """Event-loop test server; the entry-point scripts only pick options and verbosity"""
+    def __init__(self, port=8889, listener_buffer_size=None, verbose=False):
+        self.port = port
+        self.listener_buffer_size = listener_buffer_size
+        self.running = False
+        if verbose:
+            logger.setLevel(logging.DEBUG)
+        # Frames waiting for decode/save; bounded so a slow disk can't grow memory
+        self.decode_queue = queue.Queue(maxsize=8)
+        self._frame_out = None  # Decode target reused by decode_worker()
+        
+    def create_listener(self):
+        """Create a listening socket; with SO_REUSEPORT several can share the port"""
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if self.listener_buffer_size:
+            # Inherited by accepted sockets before the handshake completes
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.listener_buffer_size)
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.listener_buffer_size)
+        server_socket.bind(('0.0.0.0', self.port))
+        server_socket.listen(5)
+        return server_socket
+    
+    def start_server(self):
+        """Start the test server"""
+        # One listener per core lets the kernel balance accepts across them;
+        # without SO_REUSEPORT (e.g. Windows) fall back to a single listener
+        num_listeners = (os.cpu_count() or 1) if hasattr(socket, 'SO_REUSEPORT') else 1
+        listeners = []
+        _log_listener.start()
+        try:
+            for _ in range(num_listeners):
+                listeners.append(self.create_listener())
+            
+            print(f"🚀 Test server started on port {self.port} ({num_listeners} listener(s))")
+            print(f"💻 Laptop IP: {self.get_local_ip()}")
+            print("Waiting for connections from Raspberry Pi...")
+            print("=" * 50)
+            
+            self.running = True
+            threading.Thread(target=self.decode_worker, daemon=True).start()
+            
+            for server_socket in listeners[1:]:
+                threading.Thread(target=self.serve_forever, args=(server_socket,), daemon=True).start()
+            self.serve_forever(listeners[0])
+                        
+        except KeyboardInterrupt:
+            print("\n👋 Server shutdown requested")
+        finally:
+            self.running = False
+            for server_socket in listeners:
+                server_socket.close()
+            _log_listener.stop()
+            print("🛑 Server stopped")
+    
+    def serve_forever(self, server_socket):
+        """Multiplex one listener and all of its clients on a single selector"""
+        selector = selectors.DefaultSelector()  # epoll on Linux
+        server_socket.setblocking(False)
+        selector.register(server_socket, selectors.EVENT_READ)
+        
+        try:
+            while self.running:
+                for key, mask in selector.select(timeout=1.0):
+                    if key.data is None:
+                        self.accept_client(selector, key.fileobj)
+                        continue
+                    
+                    conn = key.data
+                    try:
+                        if mask & selectors.EVENT_READ:
+                            message = conn.recv_frame()
+                            if message is not None:
+                                logger.debug(f"✅ Received all {len(message)} bytes from {conn.address}")
+                                response, is_frame = self.process_message(conn, message)
+                                # Ack first, then leave decode/save to the worker
+                                if conn.send_frame(response):
+                                    logger.debug(f"✅ Response sent to {conn.address}")
+                                else:
+                                    selector.modify(conn.sock, selectors.EVENT_WRITE, conn)
+                                if is_frame:
+                                    self.queue_frame(conn.address, conn.message_count, message)
+                                else:
+                                    _release(message)
+                        elif conn.flush():
+                            logger.debug(f"✅ Response sent to {conn.address}")
+                            selector.modify(conn.sock, selectors.EVENT_READ, conn)
+                    except Exception as e:
+                        if not isinstance(e, ConnectionError):
+                            logger.error(f"❌ Client handling error: {e}")
+                        self.close_client(selector, conn)
+        finally:
+            for key in list(selector.get_map().values()):
+                if key.data is not None:
+                    self.close_client(selector, key.data)
+            selector.close()
+    
+    def accept_client(self, selector, server_socket):
+        """Accept a pending connection and register it with the selector"""
+        try:
+            client_socket, client_address = server_socket.accept()
+        except BlockingIOError:
+            return  # Another loop sharing the port won the race
+        except socket.error as e:
+            if self.running:
+                logger.info(f"Socket error: {e}")
+            return
+        logger.info(f"🔗 New connection from {client_address}")
+        
+        # Send acks immediately and leave room for whole frames in flight
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4*1024*1024)
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4*1024*1024)
+        if hasattr(socket, 'TCP_QUICKACK'):  # Linux only
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        client_socket.setblocking(False)
+        
+        logger.debug(f"📡 Handling client {client_address}")
+        conn = FramedConnection(client_socket, client_address)
+        selector.register(client_socket, selectors.EVENT_READ, conn)
+    
+    def close_client(self, selector, conn):
+        """Unregister and close a client connection"""
+        selector.unregister(conn.sock)
+        conn.sock.close()
+        logger.info(f"🔌 Client {conn.address} disconnected")
+    
+    def process_message(self, conn, message_data):
+        """Handle one complete message; return (response payload, is_frame)
+
+        Frames are only acknowledged here; the caller queues them for
+        decode_worker(), which takes over the buffer.
+        """
+        conn.message_count += 1
+        message_count = conn.message_count
+        client_address = conn.address
+        
+        if conn.msg_type == MSG_JPEG:
+            logger.info(f"📸 Frame {message_count} from {client_address}:")
+            logger.info(f"   Size: {len(message_data)} bytes")
+            
+            # Send simple response
+            response = f"Frame {message_count} received successfully"
+            return response.encode('utf-8'), True
+        
+        if conn.msg_type == MSG_TEST:
+            message = self.unpack_test_message(message_data)
+        elif conn.msg_type == MSG_JSON:
+            try:
+                message = json.loads(str(message_data, 'utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                message = None
+        else:
+            message = None
+        
+        if not isinstance(message, dict):
+            logger.error(f"❌ Invalid message {message_count} (type {conn.msg_type}) from {client_address}")
+            return ACK.pack(message_count, ACK_INVALID, time.time()), False
+        
+        logger.info(f"📥 Message {message_count} from {client_address}:")
+        logger.info("   Type: text message")
+        logger.info(f"   Content: {message.get('message', message.get('test', 'No message'))}")
+        logger.debug(f"   Full message: {message}")
+        
+        # Send fixed-layout ack
+        return ACK.pack(message_count, ACK_RECEIVED, time.time()), False
+    
+    def queue_frame(self, client_address, message_count, frame_data):
+        """Hand a frame to the decode worker, dropping the oldest if it is behind"""
+        while True:
+            try:
+                self.decode_queue.put_nowait((client_address, message_count, frame_data))
+                return
+            except queue.Full:
+                try:
+                    dropped_address, dropped_count, dropped_data = self.decode_queue.get_nowait()
+                    _release(dropped_data)
+                    logger.warning(f"   ⚠️  Decoder behind, dropped frame {dropped_count} from {dropped_address}")
+                except queue.Empty:
+                    pass
+    
+    def decode_frame(self, frame_data):
+        """Decode JPEG data to a BGR array, into a reused buffer when TurboJPEG is available"""
+        if _turbo_jpeg is None:
+            return cv2.imdecode(np.frombuffer(frame_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        width, height, _, _ = _turbo_jpeg.decode_header(frame_data)
+        if self._frame_out is None or self._frame_out.shape[:2] != (height, width):
+            self._frame_out = np.empty((height, width, 3), dtype=np.uint8)
+        return _turbo_jpeg.decode(frame_data, dst=self._frame_out)
+    
+    def decode_batch_gpu(self, frames_data):
+        """Decode several JPEGs on the GPU at once; None if nvJPEG fails"""
+        try:
+            tensors = [torch.frombuffer(data, dtype=torch.uint8) for data in frames_data]
+            decoded = decode_jpeg(tensors, mode=ImageReadMode.RGB, device='cuda')
+            # CHW RGB on the GPU -> HWC BGR on the host for imwrite
+            return [img.permute(1, 2, 0).flip(-1).cpu().numpy() for img in decoded]
+        except (RuntimeError, TypeError) as e:
+            logger.warning(f"⚠️  GPU decode failed ({e}), decoding on CPU")
+            return None
+    
+    def decode_worker(self):
+        """Decode and save queued frames off the network path"""
+        while True:
+            batch = [self.decode_queue.get()]
+            gpu_frames = None
+            if _GPU_DECODE:
+                # Take whatever else is waiting so the GPU decodes it in one call
+                while len(batch) < GPU_DECODE_BATCH:
+                    try:
+                        batch.append(self.decode_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                gpu_frames = self.decode_batch_gpu([frame_data for _, _, frame_data in batch])
+            
+            for index, job in enumerate(batch):
+                self.save_frame(job, gpu_frames[index] if gpu_frames is not None else None)
+    
+    def save_frame(self, job, frame=None):
+        """Decode (unless already decoded) and save one queued frame, then free its buffer"""
+        client_address, message_count, frame_data = job
+        try:
+            # Assume it's JPEG data
+            if frame is None:
+                frame = self.decode_frame(frame_data)
+            
+            if frame is not None:
+                logger.info(f"   ✅ Frame {message_count} decoded successfully: {frame.shape}")
+                # Save frame for debugging; message_count is per connection, so
+                # the client address keeps concurrent clients from overwriting each other
+                host, port = client_address[:2]
+                filename = f"received_frame_{host}_{port}_{message_count:03d}.jpg"
+                cv2.imwrite(filename, frame)
+                logger.info(f"   💾 Saved as {filename}")
+            else:
+                logger.error(f"   ❌ Could not decode frame {message_count} as image")
+                
+        except Exception as e:
+            logger.error(f"   ❌ Frame processing error: {e}")
+        finally:
+            # The decoder has copied the pixels out of the buffer
+            _release(frame_data)
+    
+    def unpack_test_message(self, data):
+        """Decode a struct-packed test message, or return None if data isn't one"""
+        if len(data) < TEST_MSG_HEADER.size:
+            return None
+        test_id, timestamp, text_length = TEST_MSG_HEADER.unpack_from(data)
+        if TEST_MSG_HEADER.size + text_length != len(data):
+            return None
+        return {
+            'test_id': test_id,
+            'timestamp': timestamp,
+            'message': str(data[TEST_MSG_HEADER.size:], 'utf-8', 'replace')
+        }
+    
+    def get_local_ip(self):
+        """Get local IP address"""
+        try:
+            # Connect to a dummy address to get local IP
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.connect(("8.8.8.8", 80))
+            ip = s.getsockname()[0]
+            s.close()
+            return ip
+        except:
+            return "Unknown"
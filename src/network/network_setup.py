@@ -14,6 +14,10 @@ Usage:
 
     # Network connectivity test
     python3 network_setup.py --mode test --target-ip 192.168.1.100
+
+    # Bandwidth test: start a discard sink on the laptop, then test from the Pi
+    python3 network_setup.py --mode sink
+    python3 network_setup.py --mode test --target-ip 192.168.1.100 --bandwidth
 """
 
 import argparse
@@ -28,6 +32,11 @@ import subprocess
 import sys
 from typing import Optional
 
+# Bandwidth test traffic is raw, unframed JPEG bytes; it goes to its own
+# sink port so neither the inference server (8888) nor the test server
+# (8889) tries to parse it as messages
+BANDWIDTH_PORT = 8890
+
 def get_local_ip() -> str:
     """Get local IP address"""
     try:
@@ -56,9 +65,13 @@ def test_network_connectivity(target_ip: str, port: int = 8888) -> bool:
         print(f"❌ Connection test failed: {e}")
         return False
 
-def test_bandwidth(target_ip: str, port: int = 8889, duration: int = 10) -> dict:
-    """Test network bandwidth with dummy data"""
-    print(f"📊 Testing bandwidth to {target_ip}:{port} for {duration}s...")
+def test_bandwidth(target_ip: str, port: int = BANDWIDTH_PORT, duration: int = 10, batch: int = 1) -> dict:
+    """Test network bandwidth with dummy data
+
+    With batch > 1, that many frames are written per sendall() to amortize
+    syscall and TCP header overhead (bulk mode, so Nagle is left on).
+    """
+    print(f"📊 Testing bandwidth to {target_ip}:{port} for {duration}s (batch={batch})...")
     
     # Simple bandwidth test
     try:
@@ -66,6 +79,7 @@ def test_bandwidth(target_ip: str, port: int = 8889, duration: int = 10) -> dict
         test_frame = np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8)
         _, encoded = cv2.imencode('.jpg', test_frame)
         frame_data = encoded.tobytes()
+        payload = frame_data * batch
         
         bytes_sent = 0
         frames_sent = 0
@@ -77,10 +91,10 @@ def test_bandwidth(target_ip: str, port: int = 8889, duration: int = 10) -> dict
             
             while time.time() - start_time < duration:
                 try:
-                    s.send(frame_data)
-                    bytes_sent += len(frame_data)
-                    frames_sent += 1
-                    time.sleep(0.033)  # ~30 FPS
+                    s.sendall(payload)
+                    bytes_sent += len(payload)
+                    frames_sent += batch
+                    time.sleep(0.033 * batch)  # ~30 FPS
                 except Exception:
                     break
         
@@ -108,6 +122,31 @@ def test_bandwidth(target_ip: str, port: int = 8889, duration: int = 10) -> dict
         print(f"❌ Bandwidth test failed: {e}")
         return {}
 
+def run_bandwidth_sink(port: int = BANDWIDTH_PORT):
+    """Accept bandwidth test connections and discard everything they send"""
+    buf = memoryview(bytearray(1024 * 1024))
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(('0.0.0.0', port))
+        server.listen(1)
+        print(f"🕳️  Bandwidth sink listening on {get_local_ip()}:{port} (Ctrl+C to stop)")
+        
+        while True:
+            conn, address = server.accept()
+            received = 0
+            start_time = time.time()
+            with conn:
+                while True:
+                    n = conn.recv_into(buf)
+                    if not n:
+                        break
+                    received += n
+            if not received:
+                continue  # Connectivity probe
+            elapsed = time.time() - start_time
+            mbps = (received * 8) / (elapsed * 1000000) if elapsed > 0 else 0
+            print(f"📥 {address[0]}: {received / 1024 / 1024:.1f} MB in {elapsed:.1f}s ({mbps:.2f} Mbps)")
+
 def setup_wifi_raspberry_pi():
     """Help setup WiFi on Raspberry Pi"""
     print("🔧 WiFi Setup for Raspberry Pi")
@@ -272,11 +311,17 @@ def run_server_tests(port: int = 8888):
 
 def main():
     parser = argparse.ArgumentParser(description='Network Setup and Testing')
-    parser.add_argument('--mode', choices=['client', 'server', 'test'], required=True,
-                        help='Test mode: client (Pi), server (laptop), or test (connectivity)')
+    parser.add_argument('--mode', choices=['client', 'server', 'test', 'sink'], required=True,
+                        help='Test mode: client (Pi), server (laptop), test (connectivity) '
+                             'or sink (laptop end of the bandwidth test)')
     parser.add_argument('--server-ip', type=str, help='Server IP address (for client mode)')
     parser.add_argument('--target-ip', type=str, help='Target IP for connectivity test')
     parser.add_argument('--port', type=int, default=8888, help='Server port')
+    parser.add_argument('--bandwidth', action='store_true', help='Also run the bandwidth test (test mode)')
+    parser.add_argument('--batch', type=int, default=1, help='Frames per send() in the bandwidth test')
+    parser.add_argument('--bandwidth-port', type=int, default=BANDWIDTH_PORT,
+                        help=f'Port of the discard sink started with --mode sink (default: {BANDWIDTH_PORT}); '
+                             'the inference (8888) and test (8889) servers would parse the raw bytes as messages')
     
     args = parser.parse_args()
     
@@ -292,12 +337,23 @@ def main():
     elif args.mode == 'server':
         run_server_tests(args.port)
         
+    elif args.mode == 'sink':
+        try:
+            run_bandwidth_sink(args.bandwidth_port)
+        except KeyboardInterrupt:
+            print("\n👋 Sink stopped")
+        
     elif args.mode == 'test':
         target_ip = args.target_ip or args.server_ip
         if not target_ip:
             print("Error: --target-ip or --server-ip required for test mode")
             sys.exit(1)
-        test_network_connectivity(target_ip, args.port)
+        if args.bandwidth:
+            # Only the sink has to be up for the bandwidth test
+            if test_network_connectivity(target_ip, args.bandwidth_port):
+                test_bandwidth(target_ip, args.bandwidth_port, batch=max(1, args.batch))
+        else:
+            test_network_connectivity(target_ip, args.port)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
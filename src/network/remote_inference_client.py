@@ -24,15 +24,32 @@ import time
 import threading
 import queue
 import numpy as np
-from dataclasses import dataclass, asdict
+from collections import deque
+from dataclasses import dataclass
 from typing import Optional, Tuple
 import struct
 import logging
 
+from _test_common import check_jpeg_build
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Optional fast JSON decoder (orjson parses bytes directly); stdlib fallback
+try:
+    import orjson
+    loads_json = orjson.loads
+except ImportError:
+    loads_json = json.loads
+
+# Fixed per-frame header (must match remote_inference_server.py):
+# sensor timestamp, steering, throttle, arduino millis, JPEG size
+FRAME_HEADER = struct.Struct('<dffQI')
+
+# Consecutive grab() failures (~5 s at the 10 ms back-off) before capture gives up
+MAX_GRAB_FAILURES = 500
+
 @dataclass
 class SensorData:
     """Current sensor reading from Arduino"""
@@ -106,16 +123,17 @@ class ArduinoInterface:
         """Background sensor reading"""
         while self.running and self.serial_conn:
             try:
-                line = self.serial_conn.readline().decode('utf-8').strip()
-                if line.startswith('DATA,'):
+                # Arduino output is ASCII; parse the raw bytes without decoding
+                line = self.serial_conn.readline().rstrip()
+                if line.startswith(b'DATA,'):
                     self._parse_sensor_data(line)
             except Exception as e:
                 logger.error(f"Sensor read error: {e}")
     
-    def _parse_sensor_data(self, line: str):
+    def _parse_sensor_data(self, line: bytes):
         """Parse Arduino sensor data"""
         try:
-            parts = line.split(',')
+            parts = line.split(b',')
             if len(parts) >= 8:
                 sensor_data = SensorData(
                     timestamp=time.time(),
@@ -136,7 +154,7 @@ class CameraStreamer:
         self.resolution = resolution
         self.cap = None
         self.running = False
-        self.frame_queue = queue.Queue(maxsize=5)  # Limit queue size for low latency
+        self.frames = deque(maxlen=1)  # Newest frame only; append/popleft are atomic
         
     def initialize(self) -> bool:
         """Initialize camera"""
@@ -173,19 +191,29 @@ class CameraStreamer:
     
     def _capture_loop(self):
         """Background frame capture"""
+        failures = 0
         while self.running and self.cap:
-            ret, frame = self.cap.read()
+            # grab() only latches the next frame and paces us at the camera rate
+            if not self.cap.grab():
+                # A failing grab() returns at once; back off instead of spinning
+                failures += 1
+                if failures >= MAX_GRAB_FAILURES:
+                    logger.error(f"Camera grab failed {failures} times in a row; stopping capture")
+                    self.running = False
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+            timestamp = time.time()
+            
+            # Skip the expensive retrieve/decode while the inference loop
+            # still holds an unconsumed frame
+            if self.frames:
+                continue
+            
+            ret, frame = self.cap.retrieve()
             if ret:
-                # Add to queue, drop old frames if queue is full
-                try:
-                    self.frame_queue.put_nowait((time.time(), frame))
-                except queue.Full:
-                    try:
-                        self.frame_queue.get_nowait()  # Drop oldest
-                        self.frame_queue.put_nowait((time.time(), frame))
-                    except queue.Empty:
-                        pass
-            time.sleep(1.0 / self.fps)
+                self.frames.append((timestamp, frame))
 
 class InferenceClient:
     """Network client for remote inference"""
@@ -195,6 +223,14 @@ class InferenceClient:
         self.server_port = server_port
         self.socket = None
         self.connected = False
+        self._enc_buf = None  # Last JPEG encode output, sent without a bytes copy
+        # Baseline (non-optimized, non-progressive) JPEG stays on libjpeg-turbo's SIMD fast path
+        self._enc_params = [cv2.IMWRITE_JPEG_QUALITY, 80,
+                            cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+                            cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+        self._hdr_buf = bytearray(FRAME_HEADER.size)
+        self._pack = FRAME_HEADER.pack_into
+        self._send = None
         
     def connect(self) -> bool:
         """Connect to inference server"""
@@ -202,6 +238,7 @@ class InferenceClient:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.settimeout(10.0)
             self.socket.connect((self.server_ip, self.server_port))
+            self._send = self.socket.sendall
             self.connected = True
             logger.info(f"✓ Connected to inference server {self.server_ip}:{self.server_port}")
             return True
@@ -222,29 +259,22 @@ class InferenceClient:
             return None
             
         try:
-            # Encode frame as JPEG
-            _, encoded_frame = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            frame_data = encoded_frame.tobytes()
+            # Encode frame as JPEG; keep the encoder's array and send it through
+            # a memoryview instead of copying it into a bytes object
+            _, self._enc_buf = cv2.imencode('.jpg', frame, self._enc_params)
+            frame_view = memoryview(self._enc_buf).cast('B')
             
-            # Create message
-            message = {
-                'timestamp': time.time(),
-                'frame_size': len(frame_data),
-                'sensor_data': asdict(sensor_data)
-            }
-            
-            # Send message header
-            header = json.dumps(message).encode()
-            header_size = len(header)
-            
-            self.socket.send(struct.pack('I', header_size))
-            self.socket.send(header)
-            self.socket.send(frame_data)
+            # Pack the fixed-shape header in place, then send header and frame
+            sd = sensor_data
+            self._pack(self._hdr_buf, 0, sd.timestamp, sd.steering_current,
+                       sd.throttle_current, sd.arduino_timestamp, frame_view.nbytes)
+            self._send(self._hdr_buf)
+            self._send(frame_view)
             
             # Receive response
             response_size = struct.unpack('I', self._recv_exact(4))[0]
             response_data = self._recv_exact(response_size)
-            response = json.loads(response_data.decode())
+            response = loads_json(response_data)
             
             # Parse control command
             if 'control_command' in response:
@@ -290,6 +320,7 @@ class RemoteInferenceController:
     def initialize(self) -> bool:
         """Initialize all systems"""
         logger.info("🚀 Initializing Remote Inference System...")
+        check_jpeg_build(logger.warning)
         
         if not self.arduino.connect():
             return False
@@ -335,8 +366,9 @@ class RemoteInferenceController:
             while self.running:
                 # Get latest frame
                 try:
-                    frame_timestamp, frame = self.camera.frame_queue.get(timeout=0.1)
-                except queue.Empty:
+                    frame_timestamp, frame = self.camera.frames.popleft()
+                except IndexError:
+                    time.sleep(0.001)
                     continue
                 
                 # Get latest sensor data
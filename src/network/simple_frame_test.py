@@ -5,50 +5,54 @@ Simple Camera Frame Test Client (Raspberry Pi)
 Tests sending camera frames to laptop test server.
 """
 
+import queue
 import socket
+import threading
 import time
-import json
-import struct
 import cv2
 import numpy as np
 
+from _test_common import (ACK, MSG_HEADER, MSG_JSON, check_jpeg_build, close_connection,
+                          dumps_json, get_capture, get_connection, local_ip, recv_exact, send_frame)
+
+PIPELINE_DEPTH = 3  # Frames in flight between pipeline stages
+FRAME_SIZE = (320, 240)  # Requested from the camera so no host-side resize is needed
+GRAYSCALE_FRAMES = True  # Y-only JPEG is ~2.5-3x smaller; set False for colour models
+
 def test_basic_connection(server_ip, server_port=8889):
     """Test basic socket connection with simple message"""
     print(f"🔗 Testing basic connection to {server_ip}:{server_port}...")
     
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(10.0)
-        sock.connect((server_ip, server_port))
+        sock = get_connection(server_ip, server_port)
         
         # Send a simple test message
         test_msg = {
             "test": "hello from raspberry pi", 
-            "timestamp": time.time(),
-            "pi_ip": "192.168.1.111"
+            "timestamp": time.monotonic_ns(),
+            "pi_ip": local_ip()
         }
-        msg_data = json.dumps(test_msg).encode()
+        msg_data = dumps_json(test_msg)
         
-        # Send length as big-endian 4-byte integer (to match server)
-        sock.send(len(msg_data).to_bytes(4, byteorder='big'))
-        sock.send(msg_data)
+        # Send length + JSON type tag, then the message
+        sock.sendall(MSG_HEADER.pack(len(msg_data), MSG_JSON) + msg_data)
         
         # Wait for response
-        response_length_bytes = sock.recv(4)
+        response_length_bytes = recv_exact(sock, 4)
         if response_length_bytes:
             response_length = int.from_bytes(response_length_bytes, byteorder='big')
-            response_data = sock.recv(response_length)
-            response = json.loads(response_data.decode())
-            print(f"✅ Received response: {response}")
-            sock.close()
+            response_data = recv_exact(sock, response_length)
+            message_id, status, server_time = ACK.unpack(response_data)
+            print(f"✅ Received ack: message {message_id}, status {status}, server time {server_time:.3f}")
             return True
         else:
             print("❌ No response received")
-            sock.close()
+            close_connection()
             return False
             
     except Exception as e:
         print(f"❌ Connection failed: {e}")
+        close_connection()
         return False
 
 def test_camera():
@@ -56,7 +60,7 @@ def test_camera():
     print("📷 Testing camera...")
     
     try:
-        cap = cv2.VideoCapture(0)
+        cap = get_capture(FRAME_SIZE)
         if not cap.isOpened():
             print("❌ Cannot open camera")
             return False
@@ -64,60 +68,67 @@ def test_camera():
         ret, frame = cap.read()
         if ret:
             print(f"✅ Camera OK: {frame.shape}")
-            cap.release()
             return True
         else:
             print("❌ Cannot read from camera")
-            cap.release()
             return False
             
     except Exception as e:
         print(f"❌ Camera test failed: {e}")
         return False
 
+def encode_frame(frame):
+    """JPEG-encode a BGR frame for sending"""
+    # The camera already delivers FRAME_SIZE; only resize if it ignored the request
+    small_frame = frame
+    if (frame.shape[1], frame.shape[0]) != FRAME_SIZE:
+        small_frame = cv2.resize(frame, FRAME_SIZE)
+    if GRAYSCALE_FRAMES:
+        # Single channel skips the colour transform and chroma DCT
+        small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
+    
+    # Encode frame as baseline JPEG (no Huffman optimization, not progressive)
+    encode_params = [cv2.IMWRITE_JPEG_QUALITY, 80,
+                     cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+                     cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+    _, encoded_frame = cv2.imencode('.jpg', small_frame, encode_params)
+    return encoded_frame
+
 def test_frame_sending(server_ip, server_port=8889):
     """Test sending camera frames to server"""
     print(f"📸 Testing frame sending to {server_ip}:{server_port}...")
     
     # Capture a test frame
-    cap = cv2.VideoCapture(0)
-    ret, frame = cap.read()
-    cap.release()
+    ret, frame = get_capture(FRAME_SIZE).read()
     
     if not ret:
         print("❌ Could not capture frame")
         return False
     
     try:
-        # Resize frame to reduce bandwidth
-        small_frame = cv2.resize(frame, (320, 240))
-        
-        # Encode frame as JPEG
-        _, encoded_frame = cv2.imencode('.jpg', small_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-        frame_data = encoded_frame.tobytes()
+        if frame.ndim == 1 or frame.shape[0] == 1:
+            # Camera delivered raw MJPEG bytes (a 1xN row); send them as-is
+            frame_view = memoryview(frame.reshape(-1))
+        else:
+            frame_view = memoryview(encode_frame(frame)).cast('B')
         
-        print(f"   Frame size: {len(frame_data)} bytes")
+        print(f"   Frame size: {frame_view.nbytes} bytes")
         
-        # Connect and send frame
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(15.0)  # Longer timeout for frame transfer
-        sock.connect((server_ip, server_port))
+        # Send frame over the shared connection
+        sock = get_connection(server_ip, server_port)
         
-        # Send frame data (server expects raw bytes for frames)
-        sock.send(len(frame_data).to_bytes(4, byteorder='big'))
-        sock.send(frame_data)
+        # Send length prefix and frame data in one write (server expects raw bytes for frames)
+        send_frame(sock, frame_view)
         
-        # Wait for response with longer timeout
-        sock.settimeout(10.0)
+        # Wait for response
         try:
-            response_length_bytes = sock.recv(4)
+            response_length_bytes = recv_exact(sock, 4)
             if response_length_bytes and len(response_length_bytes) == 4:
                 response_length = int.from_bytes(response_length_bytes, byteorder='big')
-                response_data = sock.recv(response_length)
+                response_data = recv_exact(sock, response_length)
                 if response_data:
                     response = response_data.decode('utf-8')
                     print(f"✅ Server response: {response}")
-                    sock.close()
                     return True
                 else:
                     print("❌ Empty response from server")
@@ -128,16 +139,110 @@ def test_frame_sending(server_ip, server_port=8889):
         except Exception as e:
             print(f"❌ Error receiving response: {e}")
         
-        sock.close()
+        close_connection()
         return False
             
     except Exception as e:
         print(f"❌ Frame sending failed: {e}")
+        close_connection()
+        return False
+
+def test_frame_streaming(server_ip, server_port=8889, num_frames=90):
+    """Stream frames with capture, JPEG encode and send overlapped in three threads"""
+    print(f"🎞️  Streaming {num_frames} frames to {server_ip}:{server_port}...")
+    
+    cap = get_capture(FRAME_SIZE)
+    ret, first_frame = cap.read()
+    if not ret:
+        print("❌ Could not capture frame")
+        return False
+    
+    # Raw MJPEG needs no encode stage; decoded frames are captured into a
+    # fixed pool of preallocated buffers that the encoder hands back
+    passthrough = first_frame.ndim == 1 or first_frame.shape[0] == 1
+    slots = [] if passthrough else [np.empty_like(first_frame) for _ in range(PIPELINE_DEPTH)]
+    free_slots = queue.Queue()
+    for index in range(len(slots)):
+        free_slots.put(index)
+    captured = queue.Queue(maxsize=PIPELINE_DEPTH)
+    encoded = queue.Queue(maxsize=PIPELINE_DEPTH)
+    
+    # Each stage always forwards the None sentinel, even when it fails, so
+    # the send loop below never blocks forever on encoded.get()
+    def capture_stage():
+        try:
+            for _ in range(num_frames):
+                if passthrough:
+                    ret, frame = cap.read()
+                    item = frame.reshape(-1) if ret else None
+                else:
+                    item = free_slots.get()
+                    ret, frame = cap.read(slots[item])
+                    if ret:
+                        # read() may reallocate rather than fill the slot
+                        slots[item] = frame
+                    else:
+                        free_slots.put(item)
+                if ret:
+                    captured.put(item)
+        except Exception as e:
+            print(f"❌ Capture stage failed: {e}")
+        finally:
+            captured.put(None)
+    
+    def encode_stage():
+        try:
+            while True:
+                item = captured.get()
+                if item is None:
+                    break
+                if passthrough:
+                    encoded.put(item)
+                else:
+                    encoded_frame = encode_frame(slots[item])
+                    free_slots.put(item)
+                    encoded.put(encoded_frame)
+        except Exception as e:
+            print(f"❌ Encode stage failed: {e}")
+        finally:
+            encoded.put(None)
+    
+    threading.Thread(target=capture_stage, daemon=True).start()
+    threading.Thread(target=encode_stage, daemon=True).start()
+    
+    # Send stage runs on this thread
+    try:
+        sock = get_connection(server_ip, server_port)
+        frames_sent = 0
+        bytes_sent = 0
+        start_time = time.time()
+        
+        while True:
+            encoded_frame = encoded.get()
+            if encoded_frame is None:
+                break
+            frame_view = memoryview(encoded_frame).cast('B')
+            send_frame(sock, frame_view)
+            
+            response_length = int.from_bytes(recv_exact(sock, 4), byteorder='big')
+            recv_exact(sock, response_length)
+            frames_sent += 1
+            bytes_sent += frame_view.nbytes
+        
+        elapsed = time.time() - start_time
+        fps = frames_sent / elapsed if elapsed > 0 else 0
+        print(f"✅ Streamed {frames_sent} frames ({bytes_sent / 1024:.0f} KB) at {fps:.1f} FPS")
+        return frames_sent > 0
+        
+    except Exception as e:
+        print(f"❌ Frame streaming failed: {e}")
+        close_connection()
         return False
 
 def main():
     print("🧪 Camera Frame Test - Raspberry Pi Client")
     print("=" * 50)
+    print(f"🔧 OpenCV JPEG accelerated: {'✅' if check_jpeg_build() else '❌'}")
     
     # Get server IP
     server_ip = input("Enter your laptop's IP address (192.168.1.33): ").strip()
@@ -163,11 +268,18 @@ def main():
     
     # Test 3: Frame sending
     print("TEST 3: Frame Sending")
-    if test_frame_sending(server_ip):
-        print("✅ Frame sending OK")
+    if not test_frame_sending(server_ip):
+        print("❌ Frame sending failed")
+        return
+    print("✅ Frame sending OK\n")
+    
+    # Test 4: Pipelined streaming
+    print("TEST 4: Frame Streaming")
+    if test_frame_streaming(server_ip):
+        print("✅ Frame streaming OK")
         print("\n🎉 All tests passed! Your network setup is working!")
     else:
-        print("❌ Frame sending failed")
+        print("❌ Frame streaming failed")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -6,32 +6,23 @@ Tests basic network communication with improved reliability for large data trans
 """
 
 import socket
-import json
 import time
 import cv2
-import numpy as np
-import struct
+
+from _test_common import (ACK, MSG_HEADER, MSG_JSON, check_jpeg_build, close_connection,
+                          dumps_json, get_capture, get_connection, local_ip, recv_exact, send_frame)
+
+GRAYSCALE_FRAMES = True  # Y-only JPEG is ~2.5-3x smaller; set False for colour models
+CONNECT_TIMEOUT = 30.0  # Longer timeout for large data
 
 def send_all(sock, data):
     """Send all data reliably"""
-    bytes_sent = 0
-    total_bytes = len(data)
-    
-    while bytes_sent < total_bytes:
-        try:
-            sent = sock.send(data[bytes_sent:])
-            if sent == 0:
-                raise RuntimeError("Socket connection broken")
-            bytes_sent += sent
-            
-            # Show progress for large transfers
-            if total_bytes > 10000 and bytes_sent % 50000 == 0:
-                progress = (bytes_sent / total_bytes) * 100
-                print(f"   📤 Sent: {bytes_sent}/{total_bytes} bytes ({progress:.1f}%)")
-                
-        except Exception as e:
-            print(f"❌ Error sending data: {e}")
-            return False
+    try:
+        # sendall loops over partial writes in C; the memoryview avoids copies
+        sock.sendall(memoryview(data))
+    except Exception as e:
+        print(f"❌ Error sending data: {e}")
+        return False
     
     return True
 
@@ -40,51 +31,48 @@ def test_connection(server_ip, server_port=8889):
     print(f"🔗 Testing connection to {server_ip}:{server_port}...")
     
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(10.0)  # Longer timeout
-        
-        # Increase socket buffer sizes
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024*1024)  # 1MB send buffer
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024*1024)  # 1MB receive buffer
-        
-        sock.connect((server_ip, server_port))
+        sock = get_connection(server_ip, server_port, CONNECT_TIMEOUT)
         
         # Send a simple test message
-        test_msg = {"test": "hello from raspberry pi", "timestamp": time.time()}
-        msg_data = json.dumps(test_msg).encode()
+        test_msg = {"test": "hello from raspberry pi", "timestamp": time.monotonic_ns()}
+        msg_data = dumps_json(test_msg)
         
-        # Send length as big-endian 4-byte integer (to match server)
-        length_bytes = len(msg_data).to_bytes(4, byteorder='big')
+        # Send length + JSON type tag (to match server)
+        length_bytes = MSG_HEADER.pack(len(msg_data), MSG_JSON)
         
         if not send_all(sock, length_bytes):
             print("❌ Failed to send message length")
+            close_connection()
             return False
             
         if not send_all(sock, msg_data):
             print("❌ Failed to send message data")
+            close_connection()
             return False
         
         print("✅ Message sent successfully")
         
         # Wait for response
         try:
-            response_length_data = sock.recv(4)
+            response_length_data = recv_exact(sock, 4)
             if len(response_length_data) != 4:
                 print("❌ Invalid response length data")
+                close_connection()
                 return False
                 
             response_length = int.from_bytes(response_length_data, byteorder='big')
-            response_data = sock.recv(response_length)
-            response = json.loads(response_data.decode())
-            print(f"✅ Server response: {response.get('message', 'No message')}")
-            sock.close()
+            response_data = recv_exact(sock, response_length)
+            message_id, status, _ = ACK.unpack(response_data)
+            print(f"✅ Server ack: message {message_id}, status {status}")
             return True
         except socket.timeout:
             print("⏰ Timeout waiting for response")
+            close_connection()
             return False
             
     except Exception as e:
         print(f"❌ Connection failed: {e}")
+        close_connection()
         return False
 
 def test_camera():
@@ -92,14 +80,7 @@ def test_camera():
     print("📷 Testing camera...")
     
     try:
-        cap = cv2.VideoCapture(0)
-        
-        # Set camera properties for smaller image
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        
-        ret, frame = cap.read()
-        cap.release()
+        ret, frame = get_capture().read()
         
         if ret:
             print(f"✅ Camera working: {frame.shape}")
@@ -117,72 +98,67 @@ def test_frame_sending(server_ip, frame, server_port=8889):
     print(f"📸 Testing frame sending to {server_ip}:{server_port}...")
     
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(30.0)  # Longer timeout for large data
+        sock = get_connection(server_ip, server_port, CONNECT_TIMEOUT)
         
-        # Increase socket buffer sizes
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024*1024)  # 1MB send buffer
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024*1024)  # 1MB receive buffer
-        
-        sock.connect((server_ip, server_port))
-        print("✅ Connected to server")
-        
-        # Resize frame to standard resolution
-        resized_frame = cv2.resize(frame, (640, 480))  # Standard VGA resolution
-        
-        # Encode frame as JPEG with high compression
-        encode_params = [cv2.IMWRITE_JPEG_QUALITY, 60]  # Lower quality = smaller size
-        success, encoded_frame = cv2.imencode('.jpg', resized_frame, encode_params)
-        
-        if not success:
-            print("❌ Failed to encode frame")
-            return False
+        if frame.ndim == 1 or frame.shape[0] == 1:
+            # Camera delivered raw MJPEG bytes (a 1xN row, 640x480); send them as-is
+            frame_view = memoryview(frame.reshape(-1))
+            print(f"   Frame size: {frame_view.nbytes} bytes (camera MJPEG)")
+        else:
+            # Resize frame to standard resolution
+            resized_frame = cv2.resize(frame, (640, 480))  # Standard VGA resolution
+            if GRAYSCALE_FRAMES:
+                # Single channel skips the colour transform and chroma DCT
+                resized_frame = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2GRAY)
             
-        frame_data = encoded_frame.tobytes()
-        print(f"   Frame size: {len(frame_data)} bytes (resized to {resized_frame.shape})")
-        
-        # Send frame length
-        length_bytes = len(frame_data).to_bytes(4, byteorder='big')
-        if not send_all(sock, length_bytes):
-            print("❌ Failed to send frame length")
-            return False
-        
-        print("✅ Frame length sent")
+            # Encode frame as JPEG with high compression
+            encode_params = [cv2.IMWRITE_JPEG_QUALITY, 60,  # Lower quality = smaller size
+                             cv2.IMWRITE_JPEG_OPTIMIZE, 0,  # Baseline JPEG stays on the SIMD fast path
+                             cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+            success, encoded_frame = cv2.imencode('.jpg', resized_frame, encode_params)
+            
+            if not success:
+                print("❌ Failed to encode frame")
+                return False
+                
+            frame_view = memoryview(encoded_frame).cast('B')
+            print(f"   Frame size: {frame_view.nbytes} bytes (resized to {resized_frame.shape})")
         
-        # Send frame data
-        if not send_all(sock, frame_data):
-            print("❌ Failed to send frame data")
-            return False
+        # Send frame length and data as one scatter write
+        send_frame(sock, frame_view)
         
         print("✅ Frame data sent successfully")
         
         # Wait for response
         try:
-            response_length_data = sock.recv(4)
+            response_length_data = recv_exact(sock, 4)
             if len(response_length_data) != 4:
                 print("❌ Invalid response length")
+                close_connection()
                 return False
                 
             response_length = int.from_bytes(response_length_data, byteorder='big')
             print(f"📥 Response length: {response_length}")
             
-            response_data = sock.recv(response_length)
+            response_data = recv_exact(sock, response_length)
             response_text = response_data.decode()
             print(f"✅ Server response: {response_text}")
-            sock.close()
             return True
             
         except socket.timeout:
             print("⏰ Timeout waiting for frame response")
+            close_connection()
             return False
         
     except Exception as e:
         print(f"❌ Frame sending failed: {e}")
+        close_connection()
         return False
 
 def main():
     print("🧪 Fixed Network Communication Test - Raspberry Pi Client")
     print("=" * 55)
+    print(f"🔧 OpenCV JPEG accelerated: {'✅' if check_jpeg_build() else '❌'}")
     
     # Get server IP from user
     server_ip = input("Enter your laptop's IP address (192.168.1.33): ").strip()
@@ -190,7 +166,7 @@ def main():
         server_ip = "192.168.1.33"  # Default to your laptop's IP
     
     print(f"🎯 Target server: {server_ip}:8889")
-    print("📍 Pi IP address:", socket.gethostbyname(socket.gethostname()))
+    print("📍 Pi IP address:", local_ip() or "Unknown")
     print()
     
     # Test 1: Basic connection
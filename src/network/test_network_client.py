@@ -13,57 +13,67 @@ Usage:
 import argparse
 import socket
 import time
-import json
 import sys
 
-def test_connection(server_ip, server_port=8889):
-    """Test basic network connection"""
+from _test_common import ACK, MSG_HEADER, MSG_TEST, TEST_MSG_HEADER, configure_socket, local_ip, recv_exact
+
+def receive_response(client_socket, test_id):
+    """Wait for and print the server's response to one test message"""
+    try:
+        response_length = int.from_bytes(recv_exact(client_socket, 4), byteorder='big')
+        response_data = recv_exact(client_socket, response_length)
+        message_id, status, _ = ACK.unpack(response_data)
+        
+        print(f"📥 Received ack for message {message_id} (status {status})")
+        
+    except socket.timeout:
+        print(f"⏰ Timeout waiting for response to message {test_id}")
+
+def test_connection(server_ip, server_port=8889, batch=False):
+    """Test basic network connection
+
+    In batch mode the socket is corked, all messages are written back to back
+    and the kernel coalesces them into full segments (throughput test).
+    Otherwise each message waits for its response, one per second (latency test).
+    """
     print(f"🔌 Testing connection to {server_ip}:{server_port}")
     
     try:
         # Create socket
         client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.settimeout(10.0)  # 10 second timeout
+        configure_socket(client_socket, timeout=10.0)
         
         # Try to connect
         print("⏳ Attempting to connect...")
         client_socket.connect((server_ip, server_port))
         print("✅ Connected successfully!")
         
+        if batch:
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+        
         # Send test messages
         for i in range(5):
-            message = {
-                'test_id': i + 1,
-                'timestamp': time.time(),
-                'message': f'Hello from Raspberry Pi! Test {i + 1}',
-                'pi_info': {
-                    'hostname': socket.gethostname(),
-                    'local_ip': socket.gethostbyname(socket.gethostname())
-                }
-            }
+            msg_bytes = f'Hello from Raspberry Pi! Test {i + 1}'.encode('utf-8')
             
-            # Send message
-            message_data = json.dumps(message).encode('utf-8')
+            # Send message as a fixed struct header followed by the text
+            message_data = TEST_MSG_HEADER.pack(i + 1, time.monotonic_ns(), len(msg_bytes)) + msg_bytes
             message_length = len(message_data)
             
-            # Send length first, then message
-            client_socket.send(message_length.to_bytes(4, byteorder='big'))
+            # Send length + type tag first, then message
+            client_socket.send(MSG_HEADER.pack(message_length, MSG_TEST))
             client_socket.send(message_data)
             
             print(f"📤 Sent test message {i + 1}")
             
-            # Wait for response
-            try:
-                response_length = int.from_bytes(client_socket.recv(4), byteorder='big')
-                response_data = client_socket.recv(response_length)
-                response = json.loads(response_data.decode('utf-8'))
-                
-                print(f"📥 Received response: {response['message']}")
-                
-            except socket.timeout:
-                print(f"⏰ Timeout waiting for response to message {i + 1}")
-            
-            time.sleep(1)  # Wait 1 second between messages
+            if not batch:
+                receive_response(client_socket, i + 1)
+                time.sleep(1)  # Wait 1 second between messages
+        
+        if batch:
+            # Uncorking flushes everything queued above
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+            for i in range(5):
+                receive_response(client_socket, i + 1)
         
         client_socket.close()
         print("🎉 Network test completed successfully!")
@@ -85,6 +95,8 @@ def main():
                        help='IP address of your laptop (e.g., 192.168.1.100)')
     parser.add_argument('--server-port', type=int, default=8889, 
                        help='Server port (default: 8889)')
+    parser.add_argument('--batch', action='store_true',
+                       help='Send all test messages corked (throughput) instead of one per second')
     
     args = parser.parse_args()
     
@@ -94,16 +106,16 @@ def main():
     print()
     
     # Get Pi's IP address
-    try:
-        pi_ip = socket.gethostbyname(socket.gethostname())
+    pi_ip = local_ip()
+    if pi_ip:
         print(f"📍 Raspberry Pi IP: {pi_ip}")
-    except:
+    else:
         print("📍 Could not determine Pi IP address")
     
     print()
     
     # Test connection
-    success = test_connection(args.server_ip, args.server_port)
+    success = test_connection(args.server_ip, args.server_port, args.batch)
     
     if success:
         print("\n✅ Network communication test PASSED!")
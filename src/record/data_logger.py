@@ -22,9 +22,22 @@
 # -----------------------------------------------------------------------------
 
 import pigpio
+import numpy as np
+import ctypes
 import time
-import csv
 import os
+import queue
+import struct
+import logging
+import logging.handlers
+
+# Optional: numba compiles the normalization math below; without it the
+# functions simply run as plain Python
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return lambda fn: fn
 
 # --- 1. HARDWARE CONFIGURATION ---
 
@@ -38,9 +51,14 @@ STEERING_NEUTRAL_US = 1491
 STEERING_RANGE_US = 450 
 THROTTLE_MAX_DUTY = 70.0 
 
+# Precomputed reciprocals so normalization multiplies instead of divides
+_INV_STEER_RANGE = 1.0 / STEERING_RANGE_US
+_THROTTLE_DUTY_SCALE = 100.0 / THROTTLE_MAX_DUTY  # pulse/period -> normalized throttle
+
 # --- SYNCHRONIZATION PARAMETERS ---
 CAMERA_FPS = 30.0  # Innolmaker camera framerate
 LOGGING_INTERVAL = 1.0 / CAMERA_FPS # Required time delay between logs (approx 0.0333 seconds)
+LOGGING_INTERVAL_NS = round(1e9 / CAMERA_FPS) # Same interval on the monotonic ns clock
 
 
 # --- 2. PIGPIO INITIALIZATION & LOGGER SETUP ---
@@ -58,94 +76,254 @@ FIELDNAMES = [
     'steering_raw_us',          # Raw data for debugging
     'throttle_raw_duty_percent' # Raw data for debugging
 ]
+# Fixed schema, so rows are formatted directly instead of through csv.DictWriter
+_ROW_FMTS = ('%d', '%.6f', '%.6f', '%.6f', '%d', '%.6f')
+CSV_BUFFER_SIZE = 64 * 1024
+BLOCK_FRAMES = 300  # Rows buffered per disk write (10 s at 30 Hz)
+
+# Status lines from the 30 Hz loop are only enqueued; a QueueListener thread
+# does the formatting and the blocking write to stdout
+log = logging.getLogger('data_logger')
+log.setLevel(logging.INFO)
+log.propagate = False
+_log_queue = queue.SimpleQueue()
+log.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
 
 # --- 3. RC READER CLASS ---
 
+@njit(cache=True, fastmath=True)
+def _norm_steer(pulse_width, neutral_us, inv_range_us):
+    """Pulse width (us) -> steering in [-1.0, 1.0]; 0.0 when there is no signal."""
+    if pulse_width < 10:
+        return 0.0
+    x = (pulse_width - neutral_us) * inv_range_us
+    return -1.0 if x < -1.0 else (1.0 if x > 1.0 else x)
+
+@njit(cache=True, fastmath=True)
+def _norm_throttle(pulse_width, period, duty_scale):
+    """Duty cycle -> throttle in [0.0, 1.0]; 0.0 when there is no signal."""
+    if pulse_width < 10 or period < 10:
+        return 0.0
+    x = pulse_width * duty_scale / period
+    return 0.0 if x < 0.0 else (1.0 if x > 1.0 else x)
+
 class RCReader:
     """Accurately reads PWM pulse width and period using pigpio callbacks."""
     def __init__(self, pi_instance, pin, neutral_us):
         self.pi = pi_instance
         self.pin = pin
         self.neutral_us = neutral_us
+        self._inv_range = _INV_STEER_RANGE
+        self._duty_scale = _THROTTLE_DUTY_SCALE
         self.last_tick_rising = self.pi.get_current_tick()
-        self.pulse_width = 0 
-        self.period = 0      
+        # (pulse_width, period) published as one tuple: the callback thread
+        # swaps the reference in a single store, so each snapshot a reader
+        # takes is internally consistent (no torn read between the two
+        # fields). It does not guarantee both values come from the same
+        # PWM cycle: each edge updates only one of them.
+        self.pulse_state = (0, 0)
         
         self.pi.set_mode(pin, pigpio.INPUT)
-        self.cb = self.pi.callback(pin, pigpio.EITHER_EDGE, self._cb)
+        self._watch_edges()
+
+    def _watch_edges(self):
+        """Start delivering edges of self.pin to _cb."""
+        self.cb = self.pi.callback(self.pin, pigpio.EITHER_EDGE, self._cb)
+
+    @property
+    def pulse_width(self):
+        return self.pulse_state[0]
+
+    @property
+    def period(self):
+        return self.pulse_state[1]
 
     def _cb(self, pin, level, tick):
         """Hardware callback function executed on every signal edge."""
         if level == 1: 
-            self.period = pigpio.tickDiff(self.last_tick_rising, tick)
+            self.pulse_state = (self.pulse_state[0], pigpio.tickDiff(self.last_tick_rising, tick))
             self.last_tick_rising = tick
         
         elif level == 0: 
-            self.pulse_width = pigpio.tickDiff(self.last_tick_rising, tick)
+            self.pulse_state = (pigpio.tickDiff(self.last_tick_rising, tick), self.pulse_state[1])
     
     def get_normalized_action(self):
         """Converts raw PWM data to a normalized action suitable for ML training."""
+        pulse_width, period = self.pulse_state  # One consistent snapshot
         
         if self.pin == STEERING_PIN_GPIO:
             # STEERING: Pulse Width (us) based, normalized -1.0 to 1.0
-            if self.pulse_width < 10: return 0.0 
-            
-            normalized = (self.pulse_width - self.neutral_us) / STEERING_RANGE_US
-            return max(-1.0, min(1.0, normalized))
+            return _norm_steer(pulse_width, self.neutral_us, self._inv_range)
         
         elif self.pin == THROTTLE_PIN_GPIO:
             # THROTTLE: Duty Cycle (%) based, normalized 0.0 to 1.0
-            if self.pulse_width < 10 or self.period < 10: 
-                return 0.0
-            
-            duty_cycle_percent = (self.pulse_width / self.period) * 100
-            
-            normalized = duty_cycle_percent / THROTTLE_MAX_DUTY
-            return max(0.0, min(1.0, normalized))
+            return _norm_throttle(pulse_width, period, self._duty_scale)
 
         return 0.0
 
     def get_raw_data(self):
         """Returns raw measurement data for debugging/logging."""
+        pulse_width, period = self.pulse_state  # One consistent snapshot
         if self.pin == STEERING_PIN_GPIO:
-            return self.pulse_width 
+            return pulse_width 
         elif self.pin == THROTTLE_PIN_GPIO:
             # Return Duty Cycle %
-            if self.period > 0:
-                 return (self.pulse_width / self.period) * 100
+            if period > 0:
+                 return (pulse_width / period) * 100
             return 0.0
         return 0.0
 
     def cancel(self):
         self.cb.cancel()
 
-# --- 4. MAIN LOGGING FUNCTION ---
+
+# pigpio notification report: seqno, flags, tick (us), levels of GPIO 0-31
+_NOTIFY_REPORT = struct.Struct('HHII')
+
+class RCNotifyReader(RCReader):
+    """RCReader fed from pigpiod's notification pipe instead of a per-edge callback.
+
+    pigpiod timestamps each edge in C and buffers the reports in
+    /dev/pigpio<handle>; they are drained in one read when a value is
+    requested, so no Python code (and no GIL hand-off) runs per edge.
+    Requires pigpiod on the same machine.
+    """
+    def _watch_edges(self):
+        """Open a notification pipe for self.pin instead of registering a callback."""
+        self._mask = 1 << self.pin
+        self._level = self.pi.read(self.pin)
+        self._pending = b''
+        self.handle = self.pi.notify_open()
+        self.fd = os.open(f"/dev/pigpio{self.handle}", os.O_RDONLY | os.O_NONBLOCK)
+        self.pi.notify_begin(self.handle, self._mask)
+
+    def _drain(self):
+        """Replay all buffered edge reports through the edge handler."""
+        try:
+            data = self._pending + os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        usable = len(data) - len(data) % _NOTIFY_REPORT.size
+        self._pending = data[usable:]
+        
+        for _, flags, tick, levels in _NOTIFY_REPORT.iter_unpack(data[:usable]):
+            if flags:
+                continue  # Watchdog/keep-alive/event report, not an edge
+            level = 1 if levels & self._mask else 0
+            if level != self._level:
+                self._level = level
+                self._cb(self.pin, level, tick)
+
+    def get_normalized_action(self):
+        self._drain()
+        return super().get_normalized_action()
+
+    def get_raw_data(self):
+        self._drain()
+        return super().get_raw_data()
+
+    def cancel(self):
+        self.pi.notify_close(self.handle)
+        os.close(self.fd)
+
+# --- 4. CSV BLOCK WRITER ---
+
+class CsvBlockWriter:
+    """Buffers rows column-wise in preallocated arrays and writes BLOCK_FRAMES at a time."""
+    def __init__(self, filename, block_frames=BLOCK_FRAMES):
+        self.file = open(filename, 'wb', buffering=CSV_BUFFER_SIZE)
+        self.file.write((','.join(FIELDNAMES) + '\n').encode())
+        self.columns = [np.empty(block_frames, dtype=np.float64) for _ in FIELDNAMES]
+        self.count = 0
+
+    def append(self, *values):
+        for column, value in zip(self.columns, values):
+            column[self.count] = value
+        self.count += 1
+        if self.count == len(self.columns[0]):
+            self.flush()
+
+    def flush(self):
+        if self.count:
+            block = np.column_stack([column[:self.count] for column in self.columns])
+            np.savetxt(self.file, block, fmt=_ROW_FMTS, delimiter=',')
+            self.count = 0
+        self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # Runs on CTRL+C too, so the partial last block is not lost
+        self.flush()
+        self.file.close()
+
+# --- 5. REAL-TIME SCHEDULING ---
+
+REALTIME_PRIORITY = 20  # SCHED_FIFO priority; stays below kernel IRQ threads (50)
+MCL_CURRENT, MCL_FUTURE = 1, 2  # <sys/mman.h>
+
+def configure_realtime():
+    """Pin to the last core, switch to SCHED_FIFO and lock memory (best effort).
+
+    For a fully quiet core also boot with isolcpus=<last core> on the
+    kernel command line. SCHED_FIFO and mlockall are only attempted when
+    running as root; otherwise the logger runs with normal scheduling and
+    pageable memory.
+    """
+    core = os.cpu_count() - 1
+    try:
+        os.sched_setaffinity(0, {core})
+        print(f"Pinned to CPU {core}")
+    except (AttributeError, OSError) as e:
+        print(f"Warning: could not pin CPU: {e}")
+    
+    if os.geteuid() != 0:
+        print("Not running as root: skipping SCHED_FIFO and mlockall")
+        return
+    
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(REALTIME_PRIORITY))
+        print(f"Scheduling: SCHED_FIFO priority {REALTIME_PRIORITY}")
+    except (AttributeError, OSError) as e:
+        # EINVAL/EPERM still happen as root in some containers and cgroups
+        print(f"Warning: could not enable SCHED_FIFO: {e}")
+        return
+    
+    # Keep all pages resident so the loop never stalls on a page fault
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        print(f"Warning: mlockall failed: {os.strerror(ctypes.get_errno())}")
+
+# --- 6. MAIN LOGGING FUNCTION ---
 
 def start_data_logging():
     """Main loop for logging expert commands to a CSV file."""
+    configure_realtime()
     
     # Initialize readers for both channels
-    steering_reader = RCReader(pi, STEERING_PIN_GPIO, STEERING_NEUTRAL_US)
-    throttle_reader = RCReader(pi, THROTTLE_PIN_GPIO, STEERING_NEUTRAL_US)
+    steering_reader = RCNotifyReader(pi, STEERING_PIN_GPIO, STEERING_NEUTRAL_US)
+    throttle_reader = RCNotifyReader(pi, THROTTLE_PIN_GPIO, STEERING_NEUTRAL_US)
     
     frame_counter = 0
 
     print(f"--- Starting Data Logging to: {OUTPUT_FILENAME} ---")
     print(f"Logging actions locked at {CAMERA_FPS:.1f} Hz. RC Transmitter ON. Hit CTRL+C to stop.")
     print(f"Logging interval: {LOGGING_INTERVAL*1000:.2f} ms")
+    _log_listener.start()
 
 
     try:
-        with open(OUTPUT_FILENAME, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
-            writer.writeheader()
+        with CsvBlockWriter(OUTPUT_FILENAME) as writer:
             
+            # Absolute deadlines on the monotonic clock: sleep overshoot in one
+            # iteration is absorbed by the next, so the rate never drifts
+            next_deadline = time.monotonic_ns()
             
             while True:
-                loop_start_time = time.time()
-                
-                # 1. Read Actions and Timestamp
-                current_time = loop_start_time
+                # 1. Read Actions and Timestamp (monotonic seconds, immune to clock jumps)
+                current_time = time.monotonic_ns() / 1e9
                 steer_action = steering_reader.get_normalized_action()
                 throttle_action = throttle_reader.get_normalized_action()
                 
@@ -155,27 +333,29 @@ def start_data_logging():
                 # NOTE: This frame_id should be used to name or index your video frames 
                 # for perfect synchronization during ML preprocessing.
                 
-                row = {
-                    'frame_id': frame_counter,
-                    'timestamp': current_time,
-                    'steering_normalized': steer_action,
-                    'throttle_normalized': throttle_action,
-                    'steering_raw_us': steering_reader.pulse_width,
-                    'throttle_raw_duty_percent': throttle_reader.get_raw_data()
-                }
-                writer.writerow(row)
+                writer.append(
+                    frame_counter,
+                    current_time,
+                    steer_action,
+                    throttle_action,
+                    steering_reader.pulse_width,
+                    throttle_reader.get_raw_data()
+                )
                 
-                # Optional: Print status to console (can be removed for high-speed logging)
+                # Status to console via the queue (formatted on the listener thread)
                 if frame_counter % 5 == 0:
-                     print(f"Frame: {frame_counter} | STEER: {steer_action:.4f} | THROTTLE: {throttle_action:.4f}")
+                     log.info("Frame: %d | STEER: %.4f | THROTTLE: %.4f", frame_counter, steer_action, throttle_action)
                 
                 # 3. Control Loop Timing
-                # Calculate remaining time needed for the loop to complete at 30 Hz
-                time_elapsed = time.time() - loop_start_time
-                time_to_wait = LOGGING_INTERVAL - time_elapsed
+                # Sleep until the next 30 Hz deadline
+                next_deadline += LOGGING_INTERVAL_NS
+                time_to_wait = next_deadline - time.monotonic_ns()
                 
                 if time_to_wait > 0:
-                     time.sleep(time_to_wait) 
+                     time.sleep(time_to_wait / 1e9)
+                elif time_to_wait < -LOGGING_INTERVAL_NS:
+                     # Missed whole ticks; resync rather than burst to catch up
+                     next_deadline = time.monotonic_ns()
                 
     except KeyboardInterrupt:
         print("\nLogging complete. Closing file and cleaning up GPIO.")
@@ -184,6 +364,7 @@ def start_data_logging():
     finally:
         steering_reader.cancel()
         throttle_reader.cancel()
+        _log_listener.stop()
         # Clean up the GPIO pins
         pi.stop()
 
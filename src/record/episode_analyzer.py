@@ -192,12 +192,11 @@ class EpisodeAnalyzer:
             output_path = self.episode_dir / "preview.mp4"
         
         # Get first frame to determine dimensions
-        first_frame_path = self.episode_dir / self.frame_df.iloc[0]['image_path']
-        if not first_frame_path.exists():
-            print(f"First frame not found: {first_frame_path}")
+        _, first_frame = next(self._iter_frames([0]))
+        if first_frame is None:
+            print(f"First frame not found: {self.episode_dir / self.frame_df.iloc[0]['image_path']}")
             return
         
-        first_frame = cv2.imread(str(first_frame_path))
         height, width, _ = first_frame.shape
         
         # Setup video writer
@@ -211,14 +210,9 @@ class EpisodeAnalyzer:
         
         print(f"Creating video preview: {frames_to_process} frames at {fps:.1f} FPS")
         
-        for i in range(0, len(self.frame_df), step):
-            if i >= frames_to_process:
-                break
-                
-            frame_path = self.episode_dir / self.frame_df.iloc[i]['image_path']
-            if frame_path.exists():
-                frame = cv2.imread(str(frame_path))
-                
+        rows = [i for i in range(0, len(self.frame_df), step) if i < frames_to_process]
+        for i, frame in self._iter_frames(rows):
+            if frame is not None:
                 # Add timestamp overlay
                 timestamp = self.frame_df.iloc[i]['timestamp']
                 relative_time = timestamp - self.frame_df.iloc[0]['timestamp']
@@ -246,6 +240,39 @@ class EpisodeAnalyzer:
         video_writer.release()
         print(f"✅ Video preview saved: {output_path}")
     
+    def _iter_frames(self, rows):
+        """Yield (row, frame) for ascending frame_df rows, or None for missing frames
+        
+        --video episodes store frames in one H.264 file (image_path 'frames.mp4'),
+        in frame_data.csv row order; those are decoded sequentially with
+        VideoCapture. All other rows are individual JPEG files.
+        """
+        # Position of each row within the file it is stored in
+        positions = self.frame_df.groupby('image_path').cumcount()
+        video = None
+        video_position = 0  # Index of the frame the next read() returns
+        
+        try:
+            for i in rows:
+                frame_path = self.episode_dir / self.frame_df.iloc[i]['image_path']
+                if not frame_path.exists():
+                    yield i, None
+                elif frame_path.suffix == '.mp4':
+                    if video is None:
+                        video = cv2.VideoCapture(str(frame_path))
+                    # Skip frames between sampled rows without decoding them
+                    while video_position < positions.iloc[i]:
+                        video.grab()
+                        video_position += 1
+                    ok, frame = video.read()
+                    video_position += 1
+                    yield i, frame if ok else None
+                else:
+                    yield i, cv2.imread(str(frame_path))
+        finally:
+            if video is not None:
+                video.release()
+    
     def export_training_format(self, output_path: str = None):
         """Export data in format suitable for training"""
         if output_path is None:
@@ -23,30 +23,192 @@ import serial
 import json
 import time
 import os
+import shutil
+import subprocess
 import threading
 import queue
+import asyncio
+import csv
+import struct
 from datetime import datetime
 from dataclasses import dataclass
 from typing import Optional, Tuple, List
 import numpy as np
 
-@dataclass
-class ControlSample:
-    """Single control measurement from Arduino"""
-    arduino_timestamp: int  # Arduino millis()
-    system_timestamp: float  # Python time.time()
-    steering_normalized: float  # [-1.0, 1.0]
-    throttle_normalized: float  # [0.0, 1.0]
-    steering_raw_us: int
-    throttle_raw_us: int
-    steering_period_us: int
-    throttle_period_us: int
+# Optional fast JSON encoder (orjson returns bytes directly); stdlib fallback
+try:
+    import orjson
+    dumps_json = orjson.dumps
+except ImportError:
+    def dumps_json(obj):
+        return json.dumps(obj).encode()
+
+# Clock for sample timestamps and scheduling; unlike time.time() it never
+# jumps when NTP steps the wall clock mid-episode
+clock = time.monotonic
+
+# Frames waiting for JPEG encode + write; bounds memory if the SD card stalls
+WRITE_QUEUE_SIZE = 64
+
+# Captured frames waiting for the recorder loop; capture drops (and counts) beyond this
+FRAME_QUEUE_SIZE = 8
+
+# JPEG quality for saved frames and the flags used to write them
+JPEG_QUALITY = 90
+_JPEG_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
+_FRAME_FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+
+# Optional single-file H.264 output (--video): Pi hardware encoder via ffmpeg
+VIDEO_FILENAME = "frames.mp4"
+VIDEO_CODEC = "h264_v4l2m2m"
+VIDEO_BITRATE = "4M"
+
+# Preallocated decoded-frame buffers shared by capture and the writer
+FRAME_RING_SIZE = 8
+
+# How often the recorder reports progress
+PROGRESS_INTERVAL_S = 5.0
+
+# Control samples one serial poll can buffer before the recorder drains them
+CONTROL_BUFFER_SIZE = 1024
+
+# Arduino millis() -> host clock() fit: samples kept, minimum to fit, refit period
+CLOCK_FIT_WINDOW = 200
+CLOCK_FIT_MIN_SAMPLES = 20
+CLOCK_FIT_INTERVAL_S = 1.0
+
+# One control measurement from the Arduino, stored as one packed record (48 bytes/sample, CONTROL_DTYPE.itemsize)
+CONTROL_DTYPE = np.dtype([
+    ('arduino_timestamp', 'i8'),    # Arduino millis()
+    ('system_timestamp', 'f8'),     # clock() seconds
+    ('steering_normalized', 'f8'),  # [-1.0, 1.0]
+    ('throttle_normalized', 'f8'),  # [0.0, 1.0]
+    ('steering_raw_us', 'i4'),
+    ('throttle_raw_us', 'i4'),
+    ('steering_period_us', 'i4'),
+    ('throttle_period_us', 'i4'),
+])
+
+# Binary records from pwm_recorder.ino after the BIN handshake:
+# sync, then timestamp/steer/throttle/steer_raw/throttle_raw/periods, then a byte sum
+_RECORD_SYNC = b'\xAA\x55'
+_RECORD = struct.Struct('<IffHHIIB')
+_RECORD_PAYLOAD = _RECORD.size - 1  # Bytes covered by the checksum
+_RECORD_SIZE = len(_RECORD_SYNC) + _RECORD.size
+
+# Columns as they appear on a DATA line, and how each is written to CSV
+_DATA_LINE_FIELDS = [name for name in CONTROL_DTYPE.names if name != 'system_timestamp']
+_CONTROL_CSV_FMT = ['%d', '%.6f', '%.4f', '%.4f', '%d', '%d', '%d', '%d']
+
+def drain_queue(q: queue.Queue) -> list:
+    """Take everything currently in a queue under a single lock acquisition"""
+    with q.mutex:
+        items = list(q.queue)
+        q.queue.clear()
+        if items:
+            q.not_full.notify_all()
+    return items
+
+class ControlBuffer:
+    """Preallocated batch of control samples parsed by one serial poll
+    
+    ArduinoReader.poll() fills it and the recorder drains it right after,
+    both on the event-loop thread, so a plain fill index is all the
+    bookkeeping needed. Samples beyond its capacity are counted as dropped.
+    """
+    
+    def __init__(self, size: int = CONTROL_BUFFER_SIZE):
+        self.slots = np.zeros(size, dtype=CONTROL_DTYPE)
+        self.count = 0  # Filled slots, from the start of the array
+        self.dropped = 0
+    
+    def push(self, arduino_timestamp: int, system_timestamp: float,
+             steering_normalized: float, throttle_normalized: float,
+             steering_raw_us: int, throttle_raw_us: int,
+             steering_period_us: int, throttle_period_us: int) -> bool:
+        """Fill the next free slot in place; returns False if the buffer is full"""
+        if self.count == len(self.slots):
+            self.dropped += 1
+            return False
+        
+        self.slots[self.count] = (
+            arduino_timestamp, system_timestamp,
+            steering_normalized, throttle_normalized,
+            steering_raw_us, throttle_raw_us,
+            steering_period_us, throttle_period_us
+        )
+        self.count += 1
+        return True
+    
+    def push_batch(self, rows: np.ndarray) -> int:
+        """Copy a CONTROL_DTYPE array into free slots; returns how many fit"""
+        free = len(self.slots) - self.count
+        if len(rows) > free:
+            self.dropped += len(rows) - free
+            rows = rows[:free]
+        
+        count = len(rows)
+        self.slots[self.count:self.count + count] = rows
+        self.count += count
+        return count
+    
+    def drain(self) -> np.ndarray:
+        """Copy out every buffered sample and empty the buffer"""
+        samples = self.slots[:self.count].copy()
+        self.count = 0
+        return samples
+
+class ClockSync:
+    """Linear (offset + drift) fit of host clock() time against Arduino millis()
+    
+    Each host stamp carries serial and scheduling latency; a line fitted over
+    the recent samples maps millis() back to host time without that jitter.
+    """
+    
+    def __init__(self, window: int = CLOCK_FIT_WINDOW):
+        self.window = window
+        self.arduino_ms = np.zeros(0)
+        self.host_s = np.zeros(0)
+        self.slope = None  # Host seconds per Arduino millisecond
+        self.offset = None
+        self.residual_std = None
+        self.next_fit = 0.0
+    
+    def correct(self, samples: np.ndarray):
+        """Feed raw samples into the fit, then rewrite their system_timestamp from it"""
+        if not len(samples):
+            return
+        self.arduino_ms = np.concatenate((self.arduino_ms, samples['arduino_timestamp']))[-self.window:]
+        self.host_s = np.concatenate((self.host_s, samples['system_timestamp']))[-self.window:]
+        
+        now = clock()
+        if len(self.arduino_ms) >= CLOCK_FIT_MIN_SAMPLES and now >= self.next_fit:
+            self.next_fit = now + CLOCK_FIT_INTERVAL_S
+            self.slope, self.offset = np.polyfit(self.arduino_ms, self.host_s, 1)
+            residuals = self.host_s - (self.slope * self.arduino_ms + self.offset)
+            self.residual_std = float(np.std(residuals))
+        
+        if self.slope is not None:
+            samples['system_timestamp'] = self.slope * samples['arduino_timestamp'] + self.offset
+    
+    def summary(self) -> Optional[dict]:
+        """Latest fit for the episode metadata, or None if there were too few samples"""
+        if self.slope is None:
+            return None
+        return {
+            "slope_s_per_ms": float(self.slope),
+            "offset_s": float(self.offset),
+            "residual_std_s": self.residual_std,
+            "window": len(self.arduino_ms)
+        }
 
 @dataclass
 class FrameSample:
     """Single camera frame with metadata"""
+    # Explicit slots (not slots=True) so older Raspberry Pi OS Pythons still work
+    __slots__ = ('frame_id', 'timestamp', 'image_path')
     frame_id: int
-    timestamp: float
+    timestamp: float  # clock() seconds
     image_path: str
 
 @dataclass
@@ -56,7 +218,7 @@ class EpisodeData:
     start_time: float
     end_time: float
     duration: float
-    control_samples: List[ControlSample]
+    control_samples: np.ndarray  # CONTROL_DTYPE records
     frame_samples: List[FrameSample]
     metadata: dict
 
@@ -68,30 +230,49 @@ class ArduinoReader:
         self.baudrate = baudrate
         self.serial_conn = None
         self.running = False
-        self.data_queue = queue.Queue()
+        self.binary = False  # True once the Arduino has switched to binary records
+        self.pending = b''  # Partial line/record carried over between polls
+        self.buffer = ControlBuffer()
+        self.clock_sync = ClockSync()
         
     def connect(self) -> bool:
         """Establish serial connection with Arduino"""
         try:
             self.serial_conn = serial.Serial(self.port, self.baudrate, timeout=1)
             time.sleep(2)  # Allow Arduino to reset
+            self.clock_sync = ClockSync()  # millis() restarts with the reset
             
             # Wait for Arduino ready signal
             while True:
                 line = self.serial_conn.readline().decode('utf-8').strip()
                 if line == "ARDUINO_READY":
-                    print(f"✓ Arduino connected on {self.port}")
+                    self.binary = self._request_binary()
+                    protocol = "binary" if self.binary else "text"
+                    print(f"✓ Arduino connected on {self.port} ({protocol} protocol)")
                     return True
                     
         except serial.SerialException as e:
             print(f"✗ Failed to connect to Arduino: {e}")
             return False
     
+    def _request_binary(self) -> bool:
+        """Ask the firmware for binary records; older firmware just keeps sending text"""
+        self.serial_conn.write(b'BIN\n')
+        deadline = clock() + 1.5
+        while clock() < deadline:
+            line = self.serial_conn.readline().strip()
+            if line == b'BIN_ACK':
+                return True
+        return False
+    
     def start_reading(self):
-        """Start reading data in background thread"""
+        """Start accepting data; the recorder calls poll() when the port is readable"""
         self.running = True
-        self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
-        self.read_thread.start()
+        self.pending = b''
+    
+    def fileno(self) -> int:
+        """Serial port descriptor, for the recorder's event loop"""
+        return self.serial_conn.fileno()
     
     def stop_reading(self):
         """Stop reading and close connection"""
@@ -99,32 +280,96 @@ class ArduinoReader:
         if self.serial_conn:
             self.serial_conn.close()
     
-    def _read_loop(self):
-        """Background thread for reading serial data"""
-        while self.running and self.serial_conn:
-            try:
-                line = self.serial_conn.readline().decode('utf-8').strip()
+    def poll(self):
+        """Read and parse everything the port has buffered (call when readable)"""
+        if not (self.running and self.serial_conn):
+            return
+        try:
+            # One syscall for everything buffered
+            data = self.serial_conn.read(self.serial_conn.in_waiting or 1)
+            if not data:
+                return
+            if self.binary:
+                self.pending = self._parse_records(self.pending + data)
+                return
+            lines = (self.pending + data).split(b'\n')
+            self.pending = lines.pop()  # Keep the trailing partial line
+            if lines:
+                self._parse_data_lines(lines)
+        except Exception as e:
+            print(f"Serial read error: {e}")
+    
+    def _parse_data_lines(self, lines: List[bytes]):
+        """Parse a batch of raw lines with a single numpy conversion"""
+        system_timestamp = clock()
+        # DATA,timestamp,steer,throttle,steer_raw,throttle_raw,steer_period,throttle_period
+        fields = [line[5:] for line in lines if line.startswith(b'DATA,') and line.count(b',') == 7]
+        if not fields:
+            return
+        
+        try:
+            values = np.array(b','.join(fields).split(b',')).astype(np.float64).reshape(-1, 7)
+        except ValueError:
+            # A corrupt line spoils the batch; fall back to parsing line by line
+            for line in lines:
+                line = line.decode('utf-8', 'replace').strip()
                 if line.startswith('DATA,'):
                     self._parse_data_line(line)
-            except Exception as e:
-                print(f"Serial read error: {e}")
+            return
+        
+        rows = np.empty(len(values), dtype=CONTROL_DTYPE)
+        rows['system_timestamp'] = system_timestamp
+        for column, name in enumerate(_DATA_LINE_FIELDS):
+            rows[name] = values[:, column]
+        self.buffer.push_batch(rows)
                 
+    def _parse_records(self, buf: bytes) -> bytes:
+        """Unpack every complete binary record in buf; returns the unconsumed tail"""
+        system_timestamp = clock()
+        rows = []
+        offset = 0
+        last_start = len(buf) - _RECORD_SIZE
+        while True:
+            offset = buf.find(_RECORD_SYNC, offset)
+            if offset < 0:
+                # A trailing 0xAA may be the first half of the next sync
+                tail = buf[-1:] if buf.endswith(_RECORD_SYNC[:1]) else b''
+                break
+            if offset > last_start:
+                tail = buf[offset:]
+                break
+            
+            start = offset + len(_RECORD_SYNC)
+            ts, steer, throttle, steer_raw, throttle_raw, steer_per, throttle_per, checksum = _RECORD.unpack_from(buf, start)
+            if sum(buf[start:start + _RECORD_PAYLOAD]) & 0xFF != checksum:
+                offset += 1  # Sync bytes inside other data; rescan
+                continue
+            rows.append((ts, system_timestamp, steer, throttle, steer_raw, throttle_raw, steer_per, throttle_per))
+            offset += _RECORD_SIZE
+        
+        if rows:
+            records = np.array(rows, dtype=CONTROL_DTYPE)
+            # float32 on the wire; keep the 4 decimals the text protocol carried
+            records['steering_normalized'] = np.round(records['steering_normalized'], 4)
+            records['throttle_normalized'] = np.round(records['throttle_normalized'], 4)
+            self.buffer.push_batch(records)
+        return tail
+    
     def _parse_data_line(self, line: str):
         """Parse incoming data line from Arduino"""
         try:
             parts = line.split(',')
             if len(parts) == 8:  # DATA,timestamp,steer,throttle,steer_raw,throttle_raw,steer_period,throttle_period
-                sample = ControlSample(
-                    arduino_timestamp=int(parts[1]),
-                    system_timestamp=time.time(),
-                    steering_normalized=float(parts[2]),
-                    throttle_normalized=float(parts[3]),
-                    steering_raw_us=int(parts[4]),
-                    throttle_raw_us=int(parts[5]),
-                    steering_period_us=int(parts[6]),
-                    throttle_period_us=int(parts[7])
+                self.buffer.push(
+                    int(parts[1]),    # arduino_timestamp
+                    clock(),          # system_timestamp
+                    float(parts[2]),  # steering_normalized
+                    float(parts[3]),  # throttle_normalized
+                    int(parts[4]),    # steering_raw_us
+                    int(parts[5]),    # throttle_raw_us
+                    int(parts[6]),    # steering_period_us
+                    int(parts[7])     # throttle_period_us
                 )
-                self.data_queue.put(sample)
         except (ValueError, IndexError) as e:
             print(f"Data parsing error: {e}")
 
@@ -137,22 +382,51 @@ class CameraCapture:
         self.resolution = resolution
         self.flip_vertically = flip_vertically
         self.cap = None
+        self.passthrough = False  # True when read() returns the camera's MJPEG bytes
+        self.software_flip = False  # True when the sensor can't flip and cv2.flip must
         self.running = False
-        self.frame_queue = queue.Queue()
+        self.frame_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)  # (FrameSample, frame, ring slot or None)
+        self.dropped = 0  # Frames discarded because frame_queue was full
+        # Self-pipe the capture thread writes to, so the event loop can wait on frames
+        self.ready_r, self.ready_w = os.pipe()
+        os.set_blocking(self.ready_r, False)
+        os.set_blocking(self.ready_w, False)
+        self.frame_ring = []  # Reused decoded-frame buffers (empty in passthrough)
+        self.free_slots = queue.Queue()
         self.frame_counter = 0
         
     def initialize(self) -> bool:
         """Initialize camera"""
         try:
-            self.cap = cv2.VideoCapture(self.camera_id)
+            self.cap = cv2.VideoCapture(self.camera_id, cv2.CAP_V4L2)
             self.cap.set(cv2.CAP_PROP_FPS, self.fps)
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Always hand out the newest frame
+            
+            # Flip in the sensor when possible so frames never need a pixel pass
+            self.software_flip = self.flip_vertically and not self._set_sensor_vflip()
+            
+            # Let the camera encode MJPEG; keep it compressed unless we must touch pixels
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            if not self.software_flip:
+                self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
             
             # Test capture
             ret, frame = self.cap.read()
             if ret:
-                print(f"✓ Camera initialized: {self.resolution[0]}x{self.resolution[1]} @ {self.fps}fps")
+                # Undecoded MJPEG comes back as a flat byte buffer
+                self.passthrough = frame.ndim == 1 or frame.shape[0] == 1
+                self.dropped = 0
+                
+                # Decoded frames are read into a fixed set of buffers instead of fresh arrays
+                self.frame_ring = [] if self.passthrough else [np.empty_like(frame) for _ in range(FRAME_RING_SIZE)]
+                self.free_slots = queue.Queue()
+                for slot in range(len(self.frame_ring)):
+                    self.free_slots.put(slot)
+                
+                mode = "MJPEG passthrough" if self.passthrough else "decoded"
+                print(f"✓ Camera initialized: {self.resolution[0]}x{self.resolution[1]} @ {self.fps}fps ({mode})")
                 return True
             else:
                 print("✗ Failed to capture test frame")
@@ -162,12 +436,43 @@ class CameraCapture:
             print(f"✗ Camera initialization failed: {e}")
             return False
     
+    def _set_sensor_vflip(self) -> bool:
+        """Ask the V4L2 driver to flip vertically; returns False if unsupported"""
+        try:
+            result = subprocess.run(
+                ['v4l2-ctl', '-d', f'/dev/video{self.camera_id}', '--set-ctrl=vertical_flip=1'],
+                capture_output=True, timeout=2
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        if result.returncode != 0:
+            print("⚠️  Camera has no vertical_flip control; flipping in software")
+            return False
+        return True
+    
     def start_capture(self):
         """Start capturing frames in background thread"""
         self.running = True
         self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
         self.capture_thread.start()
     
+    def fileno(self) -> int:
+        """Descriptor that turns readable when frames are queued, for the event loop"""
+        return self.ready_r
+    
+    def clear_ready(self):
+        """Consume pending frame notifications"""
+        try:
+            while os.read(self.ready_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+    
+    def release_slot(self, slot: Optional[int]):
+        """Return a frame buffer once its frame has been written or dropped"""
+        if slot is not None:
+            self.free_slots.put(slot)
+    
     def stop_capture(self):
         """Stop capture and cleanup"""
         self.running = False
@@ -175,42 +480,62 @@ class CameraCapture:
             self.cap.release()
     
     def _capture_loop(self):
-        """Background thread for frame capture"""
-        frame_interval = 1.0 / self.fps
-        last_frame_time = time.time()
-        
+        """Background thread for frame capture, paced by the camera itself"""
         while self.running and self.cap:
-            current_time = time.time()
-            
-            if current_time - last_frame_time >= frame_interval:
+            slot = None
+            if self.frame_ring:
+                # Wait for the writer to hand back a buffer; the camera keeps the newest frame
+                try:
+                    slot = self.free_slots.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                # read() blocks until the driver delivers the next frame
+                ret, frame = self.cap.read(self.frame_ring[slot])
+            else:
                 ret, frame = self.cap.read()
-                if ret:
-                    # Apply vertical flip if requested
-                    if self.flip_vertically:
-                        frame = cv2.flip(frame, 0)  # 0 = flip around x-axis (vertical flip)
-                    
-                    self.frame_counter += 1
-                    frame_sample = FrameSample(
-                        frame_id=self.frame_counter,
-                        timestamp=current_time,
-                        image_path=""  # Will be set when saved
-                    )
-                    self.frame_queue.put((frame_sample, frame))
-                    last_frame_time = current_time
-                else:
-                    print("Failed to capture frame")
+            current_time = clock()
+            if not ret:
+                self.release_slot(slot)
+                print("Failed to capture frame")
+                continue
             
-            time.sleep(0.001)  # Small sleep to prevent CPU spinning
+            # Apply vertical flip in place if the sensor couldn't do it
+            if self.software_flip:
+                cv2.flip(frame, 0, frame)  # 0 = flip around x-axis (vertical flip)
+            
+            self.frame_counter += 1
+            frame_sample = FrameSample(
+                frame_id=self.frame_counter,
+                timestamp=current_time,
+                image_path=""  # Will be set when saved
+            )
+            try:
+                self.frame_queue.put_nowait((frame_sample, frame, slot))
+            except queue.Full:
+                self.release_slot(slot)
+                self.dropped += 1
+                continue
+            try:
+                os.write(self.ready_w, b'\x01')
+            except BlockingIOError:
+                pass  # Pipe already full of notifications; the recorder will wake anyway
 
 class EpisodeRecorder:
     """Coordinates episode recording"""
     
-    def __init__(self, output_dir: str, episode_duration: int = 15):
+    def __init__(self, output_dir: str, episode_duration: int = 15, video: bool = False):
         self.output_dir = output_dir
         self.episode_duration = episode_duration
+        self.video = video  # Encode frames into one H.264 file instead of JPEGs
+        self.frame_storage = "jpeg"  # What the current episode actually stored
         self.arduino_reader = ArduinoReader()
         self.camera = CameraCapture()
         
+        # Frame persistence runs in a writer thread so encoding never blocks the loop
+        self.write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.frame_samples_lock = threading.Lock()
+        self.dropped_frames = 0
+        
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
@@ -234,54 +559,43 @@ class EpisodeRecorder:
         if not self.camera.initialize():
             return False
         
+        # Episode data collection
+        control_chunks = []  # CONTROL_DTYPE arrays, joined once at the end
+        frame_samples = []
+        self.dropped_frames = 0
+        self.arduino_reader.buffer.dropped = 0
+        
+        # CSVs are written as data arrives, so nothing is left to serialize afterwards
+        control_csv = open(os.path.join(episode_dir, "control_data.csv"), 'w', newline='')
+        control_csv.write(','.join(CONTROL_DTYPE.names) + '\n')
+        frame_csv = open(os.path.join(episode_dir, "frame_data.csv"), 'w', newline='')
+        frame_writer = csv.writer(frame_csv)
+        frame_writer.writerow(['frame_id', 'timestamp', 'image_path'])
+        
+        # One H.264 stream instead of thousands of JPEG files, if requested
+        video = self._start_video(episode_dir) if self.video else None
+        self.frame_storage = "h264" if video is not None else "jpeg"  # The writer downgrades this on fallback
+        
+        # Start frame writer before capture so no frame waits on the loop
+        writer_thread = threading.Thread(
+            target=self._writer_loop, args=(episode_dir, frame_samples, frame_writer, video), daemon=True
+        )
+        writer_thread.start()
+        
         # Start data collection
+        self.camera.clear_ready()
         self.arduino_reader.start_reading()
         self.camera.start_capture()
         
-        # Episode data collection
-        control_samples = []
-        frame_samples = []
+        # Wall-clock anchor for the monotonic sample timestamps
         start_time = time.time()
-        end_time = start_time + self.episode_duration
+        start_clock = clock()
+        end_clock = start_clock + self.episode_duration
         
         print("🔴 Recording started...")
         
         try:
-            while time.time() < end_time:
-                current_time = time.time()
-                elapsed = current_time - start_time
-                remaining = self.episode_duration - elapsed
-                
-                # Collect control data
-                try:
-                    while True:
-                        control_sample = self.arduino_reader.data_queue.get_nowait()
-                        control_samples.append(control_sample)
-                except queue.Empty:
-                    pass
-                
-                # Collect frame data
-                try:
-                    while True:
-                        frame_sample, frame = self.camera.frame_queue.get_nowait()
-                        
-                        # Save frame
-                        frame_filename = f"frame_{frame_sample.frame_id:06d}.jpg"
-                        frame_path = os.path.join(episode_dir, "frames", frame_filename)
-                        cv2.imwrite(frame_path, frame)
-                        
-                        # Update frame sample with path
-                        frame_sample.image_path = os.path.join("frames", frame_filename)
-                        frame_samples.append(frame_sample)
-                        
-                except queue.Empty:
-                    pass
-                
-                # Progress update
-                if int(elapsed) % 5 == 0 and elapsed > 0:
-                    print(f"⏱️  {elapsed:.0f}s | Controls: {len(control_samples)} | Frames: {len(frame_samples)} | Remaining: {remaining:.0f}s")
-                
-                time.sleep(0.01)  # Small sleep
+            asyncio.run(self._collect(start_clock, end_clock, control_chunks, control_csv, frame_samples))
         
         except KeyboardInterrupt:
             print("\n⏹️  Recording interrupted by user")
@@ -290,14 +604,31 @@ class EpisodeRecorder:
             # Stop data collection
             self.arduino_reader.stop_reading()
             self.camera.stop_capture()
+            chunk = self.arduino_reader.buffer.drain()
+            self.arduino_reader.clock_sync.correct(chunk)
+            control_chunks.append(chunk)
+            control_samples = np.concatenate(control_chunks)
+            np.savetxt(control_csv, chunk, fmt=_CONTROL_CSV_FMT, delimiter=',')
+            control_csv.close()
+            
+            # Flush frames already captured, then stop the writer
+            for item in drain_queue(self.camera.frame_queue):
+                self._enqueue_frame(item)
+            self.write_queue.put(None)
+            writer_thread.join(timeout=10.0)
+            if writer_thread.is_alive():
+                print("⚠️  Frame writer did not finish in time; some frames may be missing")
+            frame_csv.close()
+            if video is not None:
+                self._finish_video(video)
             
-            actual_duration = time.time() - start_time
+            actual_duration = clock() - start_clock
             
             # Create episode data structure
             episode_data = EpisodeData(
                 episode_id=episode_id,
                 start_time=start_time,
-                end_time=time.time(),
+                end_time=start_time + actual_duration,
                 duration=actual_duration,
                 control_samples=control_samples,
                 frame_samples=frame_samples,
@@ -308,7 +639,13 @@ class EpisodeRecorder:
                     "total_control_samples": len(control_samples),
                     "total_frames": len(frame_samples),
                     "avg_control_rate": len(control_samples) / actual_duration if actual_duration > 0 else 0,
-                    "avg_frame_rate": len(frame_samples) / actual_duration if actual_duration > 0 else 0
+                    "avg_frame_rate": len(frame_samples) / actual_duration if actual_duration > 0 else 0,
+                    "frame_storage": self.frame_storage,
+                    "dropped_frames": self.dropped_frames + self.camera.dropped,
+                    "dropped_control_samples": self.arduino_reader.buffer.dropped,
+                    "timestamp_clock": "monotonic",
+                    "monotonic_at_start": start_clock,  # Wall time of a sample = start_time + (ts - this)
+                    "arduino_clock_fit": self.arduino_reader.clock_sync.summary()
                 }
             )
             
@@ -320,80 +657,183 @@ class EpisodeRecorder:
             print(f"⏱️  Duration: {actual_duration:.1f}s")
             print(f"🎮 Control samples: {len(control_samples)} ({len(control_samples)/actual_duration:.1f} Hz)")
             print(f"📷 Frame samples: {len(frame_samples)} ({len(frame_samples)/actual_duration:.1f} Hz)")
+            if self.dropped_frames or self.camera.dropped:
+                print(f"⚠️  Dropped frames: {self.dropped_frames + self.camera.dropped} "
+                      f"(capture: {self.camera.dropped}, writer: {self.dropped_frames})")
+            if self.arduino_reader.buffer.dropped:
+                print(f"⚠️  Dropped control samples: {self.arduino_reader.buffer.dropped}")
             
         return True
     
-    def _save_episode_data(self, episode_dir: str, episode_data: EpisodeData):
-        """Save episode metadata and synchronized data"""
+    async def _collect(self, start_clock: float, end_clock: float, control_chunks: list,
+                       control_csv, frame_samples: List[FrameSample]):
+        """Dispatch serial data and frames from one event loop until the deadline"""
+        loop = asyncio.get_running_loop()
+        serial_fd = self.arduino_reader.fileno()
+        frame_fd = self.camera.fileno()
+        control_count = 0
+        
+        def on_serial():
+            nonlocal control_count
+            self.arduino_reader.poll()
+            chunk = self.arduino_reader.buffer.drain()
+            self.arduino_reader.clock_sync.correct(chunk)
+            if len(chunk):
+                control_chunks.append(chunk)
+                control_count += len(chunk)
+                np.savetxt(control_csv, chunk, fmt=_CONTROL_CSV_FMT, delimiter=',')
         
-        # Convert to serializable format
-        episode_dict = {
+        def on_frames():
+            self.camera.clear_ready()
+            # Hand frames to the writer thread
+            for item in drain_queue(self.camera.frame_queue):
+                self._enqueue_frame(item)
+        
+        loop.add_reader(serial_fd, on_serial)
+        loop.add_reader(frame_fd, on_frames)
+        try:
+            next_progress = start_clock + PROGRESS_INTERVAL_S
+            while True:
+                # Sleep straight to the next progress report or the end of the episode
+                current_time = clock()
+                if current_time >= end_clock:
+                    break
+                if current_time >= next_progress:
+                    next_progress += PROGRESS_INTERVAL_S
+                    with self.frame_samples_lock:
+                        frames_written = len(frame_samples)
+                    print(f"⏱️  {current_time - start_clock:.0f}s | Controls: {control_count} | Frames: {frames_written} | Remaining: {end_clock - current_time:.0f}s")
+                await asyncio.sleep(min(next_progress, end_clock) - current_time)
+        finally:
+            loop.remove_reader(serial_fd)
+            loop.remove_reader(frame_fd)
+    
+    def _enqueue_frame(self, item):
+        """Queue a frame for writing, dropping the oldest one if the writer is behind"""
+        while True:
+            try:
+                self.write_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    _, _, slot = self.write_queue.get_nowait()
+                    self.camera.release_slot(slot)
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+    
+    def _start_video(self, episode_dir: str) -> Optional[subprocess.Popen]:
+        """Start an ffmpeg process that encodes piped frames to VIDEO_FILENAME"""
+        if shutil.which('ffmpeg') is None:
+            print("⚠️  ffmpeg not found; saving JPEG frames instead")
+            return None
+        
+        if self.camera.passthrough:
+            source = ['-f', 'mjpeg']
+        else:
+            height, width = self.camera.frame_ring[0].shape[:2]
+            source = ['-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}']
+        command = (
+            ['ffmpeg', '-loglevel', 'error', '-y'] + source +
+            ['-r', str(self.camera.fps), '-i', '-',
+             '-c:v', VIDEO_CODEC, '-b:v', VIDEO_BITRATE, '-pix_fmt', 'yuv420p',
+             os.path.join(episode_dir, VIDEO_FILENAME)]
+        )
+        return subprocess.Popen(command, stdin=subprocess.PIPE, bufsize=0)  # Unbuffered: frames are large writes
+    
+    def _finish_video(self, video: subprocess.Popen):
+        """Close ffmpeg's input and wait for it to finalize the file"""
+        try:
+            video.stdin.close()
+        except OSError:
+            pass
+        try:
+            video.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            video.kill()
+            print("⚠️  ffmpeg did not finish; the video file may be incomplete")
+    
+    def _writer_loop(self, episode_dir: str, frame_samples: List[FrameSample], frame_writer,
+                     video: Optional[subprocess.Popen] = None):
+        """Background thread that encodes and saves frames until it gets None"""
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                break
+            frame_sample, frame, slot = item
+            
+            if video is not None:
+                # Rows in frame_data.csv follow the order of frames in the video
+                try:
+                    video.stdin.write(frame)
+                except OSError as e:
+                    print(f"⚠️  Video encoder failed ({e}); saving JPEG frames instead")
+                    video = None
+                    # Rows already in the video keep their image_path; the rest become JPEGs
+                    self.frame_storage = "h264+jpeg" if frame_samples else "jpeg"
+                else:
+                    self.camera.release_slot(slot)
+                    frame_sample.image_path = VIDEO_FILENAME
+            
+            if video is None:
+                if self.camera.passthrough:
+                    jpeg = frame  # Already JPEG-encoded by the camera
+                else:
+                    # Encode in memory and write with one syscall, skipping imwrite's path/codec lookup
+                    ok, jpeg = cv2.imencode('.jpg', frame, _JPEG_PARAMS)
+                    self.camera.release_slot(slot)  # jpeg is a copy; the buffer can be reused
+                    if not ok:
+                        print(f"Failed to encode frame {frame_sample.frame_id}")
+                        continue
+                
+                frame_filename = f"frame_{frame_sample.frame_id:06d}.jpg"
+                frame_path = os.path.join(episode_dir, "frames", frame_filename)
+                fd = os.open(frame_path, _FRAME_FILE_FLAGS, 0o644)
+                try:
+                    os.write(fd, jpeg)
+                finally:
+                    os.close(fd)
+                
+                # Update frame sample with path
+                frame_sample.image_path = os.path.join("frames", frame_filename)
+            
+            with self.frame_samples_lock:
+                frame_samples.append(frame_sample)
+            frame_writer.writerow([frame_sample.frame_id, frame_sample.timestamp, frame_sample.image_path])
+    
+    def _save_episode_data(self, episode_dir: str, episode_data: EpisodeData):
+        """Save episode metadata and samples, streaming one sample per line"""
+        header = {
             "episode_id": episode_data.episode_id,
             "start_time": episode_data.start_time,
             "end_time": episode_data.end_time,
             "duration": episode_data.duration,
-            "metadata": episode_data.metadata,
-            "control_samples": [
-                {
-                    "arduino_timestamp": s.arduino_timestamp,
-                    "system_timestamp": s.system_timestamp,
-                    "steering_normalized": s.steering_normalized,
-                    "throttle_normalized": s.throttle_normalized,
-                    "steering_raw_us": s.steering_raw_us,
-                    "throttle_raw_us": s.throttle_raw_us,
-                    "steering_period_us": s.steering_period_us,
-                    "throttle_period_us": s.throttle_period_us
-                }
-                for s in episode_data.control_samples
-            ],
-            "frame_samples": [
-                {
-                    "frame_id": f.frame_id,
-                    "timestamp": f.timestamp,
-                    "image_path": f.image_path
-                }
-                for f in episode_data.frame_samples
-            ]
+            "metadata": episode_data.metadata
         }
+        names = CONTROL_DTYPE.names
         
-        # Save as JSON
+        # Save as JSON without materializing the whole episode as one dict
         metadata_path = os.path.join(episode_dir, "episode_data.json")
-        with open(metadata_path, 'w') as f:
-            json.dump(episode_dict, f, indent=2)
-        
-        # Also save as CSV for easy analysis
-        self._save_csv_format(episode_dir, episode_data)
+        with open(metadata_path, 'wb') as f:
+            f.write(b'{\n')
+            for key, value in header.items():
+                f.write(b'  ' + dumps_json(key) + b': ' + dumps_json(value) + b',\n')
+            self._write_json_array(f, "control_samples", (
+                dict(zip(names, row)) for row in episode_data.control_samples.tolist()
+            ))
+            f.write(b',\n')
+            self._write_json_array(f, "frame_samples", (
+                {"frame_id": s.frame_id, "timestamp": s.timestamp, "image_path": s.image_path}
+                for s in episode_data.frame_samples
+            ))
+            f.write(b'\n}\n')
     
-    def _save_csv_format(self, episode_dir: str, episode_data: EpisodeData):
-        """Save data in CSV format for analysis"""
-        import csv
-        
-        # Control data CSV
-        control_csv_path = os.path.join(episode_dir, "control_data.csv")
-        with open(control_csv_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'arduino_timestamp', 'system_timestamp', 'steering_normalized', 
-                'throttle_normalized', 'steering_raw_us', 'throttle_raw_us',
-                'steering_period_us', 'throttle_period_us'
-            ])
-            for sample in episode_data.control_samples:
-                writer.writerow([
-                    sample.arduino_timestamp, sample.system_timestamp,
-                    sample.steering_normalized, sample.throttle_normalized,
-                    sample.steering_raw_us, sample.throttle_raw_us,
-                    sample.steering_period_us, sample.throttle_period_us
-                ])
-        
-        # Frame data CSV
-        frame_csv_path = os.path.join(episode_dir, "frame_data.csv")
-        with open(frame_csv_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['frame_id', 'timestamp', 'image_path'])
-            for sample in episode_data.frame_samples:
-                writer.writerow([
-                    sample.frame_id, sample.timestamp, sample.image_path
-                ])
+    @staticmethod
+    def _write_json_array(f, name: str, records):
+        """Write records as a JSON array member, one record per line"""
+        f.write(b'  ' + dumps_json(name) + b': [\n    ')
+        f.write(b',\n    '.join(map(dumps_json, records)))
+        f.write(b'\n  ]')
 
 def main():
     parser = argparse.ArgumentParser(description='RC Car Episode Data Collector')
@@ -401,6 +841,7 @@ def main():
     parser.add_argument('--output-dir', type=str, default='./episodes', help='Output directory for episodes')
     parser.add_argument('--arduino-port', type=str, default='/dev/ttyACM0', help='Arduino serial port')
     parser.add_argument('--camera-id', type=int, default=0, help='Camera device ID')
+    parser.add_argument('--video', action='store_true', help=f'Save frames as one H.264 {VIDEO_FILENAME} instead of JPEGs')
     
     args = parser.parse_args()
     
@@ -413,7 +854,8 @@ def main():
     
     recorder = EpisodeRecorder(
         output_dir=args.output_dir,
-        episode_duration=args.episode_duration
+        episode_duration=args.episode_duration,
+        video=args.video
     )
     
     # Update Arduino reader and camera settings if provided
@@ -7,6 +7,21 @@ const byte THROTTLE_PIN = 2;  // Pin for throttle PWM (900Hz, 0-70% duty)
 const byte STEERING_PIN = 3;  // Pin for steering PWM (50Hz, 5-9.2% duty)
 const unsigned long SAMPLE_RATE_MS = 33; // ~30Hz to match camera (33.33ms)
 
+// -------------------- Binary Protocol --------------------
+// Text DATA lines are the default. A host that sends "BIN\n" gets "BIN_ACK"
+// and from then on fixed-size records: 0xAA 0x55, DataRecord, 1-byte sum
+// of the DataRecord bytes. Little-endian, matches struct '<IffHHII' + 'B'.
+struct __attribute__((packed)) DataRecord {
+  uint32_t timestamp;
+  float steer_norm;
+  float throttle_norm;
+  uint16_t steer_raw;
+  uint16_t throttle_raw;
+  uint32_t steer_period;
+  uint32_t throttle_period;
+};
+bool binaryMode = false;
+
 // -------------------- Global Variables - Throttle --------------------
 volatile unsigned long throttle_lastRise = 0;
 volatile unsigned long throttle_highTime = 0;
@@ -52,6 +67,16 @@ void loop() {
   static unsigned long lastSampleTime = 0;
   unsigned long currentTime = millis();
   
+  // Switch to binary records when the host asks for them
+  if (Serial.available()) {
+    String command = Serial.readStringUntil('\n');
+    command.trim();
+    if (command == "BIN") {
+      binaryMode = true;
+      Serial.println("BIN_ACK");
+    }
+  }
+  
   // Sample at consistent rate
   if (currentTime - lastSampleTime >= SAMPLE_RATE_MS) {
     lastSampleTime = currentTime;
@@ -142,6 +167,22 @@ void sendDataPacket(unsigned long timestamp, float steer_norm, float throttle_no
                    unsigned long steer_raw, unsigned long throttle_raw,
                    unsigned long steer_period, unsigned long throttle_period) {
   
+  if (binaryMode) {
+    DataRecord record = {timestamp, steer_norm, throttle_norm,
+                         (uint16_t)steer_raw, (uint16_t)throttle_raw,
+                         steer_period, throttle_period};
+    const uint8_t* bytes = (const uint8_t*)&record;
+    uint8_t checksum = 0;
+    for (size_t i = 0; i < sizeof(record); i++) {
+      checksum += bytes[i];
+    }
+    Serial.write(0xAA);
+    Serial.write(0x55);
+    Serial.write(bytes, sizeof(record));
+    Serial.write(checksum);
+    return;
+  }
+  
   // Send data in CSV-like format for easy parsing
   Serial.print("DATA,");
   Serial.print(timestamp);
@@ -3,7 +3,9 @@
 # Arduino reads PWM on pins 2&3, sends via USB serial to Raspberry Pi
 
 import lgpio
-import time
+import signal
+
+DISPLAY_INTERVAL_S = 0.2  # Console refresh period; edges are timed by the kernel
 
 # --- HARDWARE CONFIGURATION (DEPRECATED) ---
 # BCM (GPIO) Pin assignments on the Raspberry Pi
@@ -18,38 +20,65 @@ except lgpio.error as e:
     print(f"Error opening GPIO chip: {e}")
     exit()
 
-# --- CLAIM PINS AS INPUT ---
+# Per-pin edge state: last rising edge, pulse width and period (all kernel ns)
+edges = {
+    gpio: {'rise': None, 'pulse_ns': 0, 'period_ns': 0}
+    for gpio in (STEERING_PIN_GPIO, THROTTLE_PIN_GPIO)
+}
+
+def on_edge(chip, gpio, level, timestamp):
+    """lgpio alert callback: measure PWM from kernel edge timestamps"""
+    state = edges[gpio]
+    if level == 1:
+        if state['rise'] is not None:
+            state['period_ns'] = timestamp - state['rise']
+        state['rise'] = timestamp
+    elif level == 0 and state['rise'] is not None:
+        state['pulse_ns'] = timestamp - state['rise']
+
+def show(signum, frame):
+    """Timer handler: print the latest measurement for both channels"""
+    parts = []
+    for name, gpio in (("Steering", STEERING_PIN_GPIO), ("Throttle", THROTTLE_PIN_GPIO)):
+        state = edges[gpio]
+        period_us = state['period_ns'] / 1000
+        pulse_us = state['pulse_ns'] / 1000
+        duty = 100 * pulse_us / period_us if period_us else 0.0
+        parts.append(f"{name} (Pin {gpio}): {pulse_us:7.1f}us / {period_us:8.1f}us ({duty:5.2f}%)")
+    print("\r" + " | ".join(parts), end="", flush=True)
+
+# --- CLAIM PINS FOR EDGE ALERTS ---
+callbacks = []
 try:
-    # Claim the GPIO pins for input
-    lgpio.gpio_claim_input(h, STEERING_PIN_GPIO)
-    lgpio.gpio_claim_input(h, THROTTLE_PIN_GPIO)
-    print(f"Successfully claimed GPIO {STEERING_PIN_GPIO} and {THROTTLE_PIN_GPIO} as inputs.")
+    # Claim the GPIO pins so the kernel timestamps both edges for us
+    for gpio in (STEERING_PIN_GPIO, THROTTLE_PIN_GPIO):
+        lgpio.gpio_claim_alert(h, gpio, lgpio.BOTH_EDGES)
+        callbacks.append(lgpio.callback(h, gpio, lgpio.BOTH_EDGES, on_edge))
+    print(f"Successfully claimed GPIO {STEERING_PIN_GPIO} and {THROTTLE_PIN_GPIO} for edge alerts.")
 except lgpio.error as e:
     print(f"Error claiming GPIO pins: {e}")
     lgpio.gpiochip_close(h)
     exit()
 
-print("\n--- Starting GPIO Read Loop ---")
-print("This script reads the raw digital state (1 for HIGH, 0 for LOW).")
+print("\n--- Listening for PWM edges ---")
+print("Pulse width and period are measured from kernel edge timestamps.")
 print("Move your transmitter controls to see if the values change.")
 print("Hit CTRL+C to stop.\n")
 
 try:
+    signal.signal(signal.SIGALRM, show)
+    signal.setitimer(signal.ITIMER_REAL, DISPLAY_INTERVAL_S, DISPLAY_INTERVAL_S)
     while True:
-        # Read the digital level of the GPIO pins
-        steer_level = lgpio.gpio_read(h, STEERING_PIN_GPIO)
-        throttle_level = lgpio.gpio_read(h, THROTTLE_PIN_GPIO)
-
-        print(f"\rTimestamp: {time.time():.2f} | Steering (Pin {STEERING_PIN_GPIO}): {steer_level} | Throttle (Pin {THROTTLE_PIN_GPIO}): {throttle_level}", end="")
-
-        # Sleep for a short duration to make the output readable
-        time.sleep(0.05)
+        signal.pause()
 
 except KeyboardInterrupt:
     print("\n\n--- Loop stopped by user ---")
 
 finally:
     # --- CLEANUP ---
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    for cb in callbacks:
+        cb.cancel()
     print("Releasing GPIO pins and closing chip handle.")
     # Free the GPIO pins
     lgpio.gpio_free(h, STEERING_PIN_GPIO)